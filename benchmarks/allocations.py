@@ -0,0 +1,99 @@
+"""
+Measures the memory that one evaluation of all the participants allocates,
+once with a new bundle per participant and once with participate_into and a
+preallocated bundle. tracemalloc only sees the memory that is alive, so we
+count the bytes of every VolumeBundle that is created in between. Run it
+from the root of the repository with
+
+    python -m benchmarks.allocations [world.json duo.json ...]
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import core.bundle as bundle
+import fast_labor_economy.labor_economy as ne
+import labor_economy.labor_economy as le
+import market.base as mb
+from read_world import read_world
+
+ROUNDS = 200
+
+class BundleCounter:
+    """
+    Counts the VolumeBundles created while it is installed and the bytes of
+    their arrays.
+    """
+
+    def __init__(self):
+        self.bundles = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        self._init = bundle.VolumeBundle.__init__
+        init = self._init
+        def counting_init(vb, error, double_volume):
+            self.bundles += 1
+            self.bytes += np.asarray(error).nbytes + np.asarray(double_volume).nbytes
+            init(vb, error, double_volume)
+        bundle.VolumeBundle.__init__ = counting_init
+        return self
+
+    def __exit__(self, *args):
+        bundle.VolumeBundle.__init__ = self._init
+
+def old_iteration(participants, prices) -> bundle.VolumeBundle:
+    # one_iteration as it was before participate_into
+    eb = bundle.VolumeBundle.zero(prices.shape)
+    for p in participants:
+        eb += p.participate(prices)
+    return eb
+
+def measure(participants, prices, iterate) -> tuple[float, float, int, float]:
+    """
+    Returns the bundles and bytes allocated per round, the peak of the traced
+    memory and the seconds per round.
+    """
+    iterate(prices)
+    tracemalloc.start()
+    with BundleCounter() as counter:
+        for _ in range(ROUNDS):
+            iterate(prices)
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        iterate(prices)
+    seconds = (time.perf_counter() - start) / ROUNDS
+    return (counter.bundles / ROUNDS, counter.bytes / ROUNDS, peak, seconds)
+
+def main() -> int:
+    filenames = sys.argv[1:] or ["world.json", "duo.json"]
+    print(f"{'world':<12}{'economy':<8}{'path':<10}{'bundles':>10}{'bytes':>12}"
+          f"{'peak':>10}{'ms':>8}")
+    for filename in filenames:
+        with open(filename, "r", encoding='utf8') as input_stream:
+            economy_config = read_world(json.load(input_stream))
+        for (name, module) in [("labor", le), ("fast", ne)]:
+            economy = module.LaborEconomy.from_config(economy_config)
+            participants = list(economy.participants())
+            width = economy.market_schema().global_width()
+            prices = np.random.default_rng(0).uniform(50, 150, width)
+            buffer = bundle.VolumeBundle.zero(prices.shape)
+            paths = [
+                ("new", lambda p: old_iteration(participants, p)),
+                ("into", lambda p: mb.one_iteration(participants, p, buffer)),
+            ]
+            for (path, iterate) in paths:
+                (bundles, allocated, peak, seconds) = measure(participants,
+                                                              prices, iterate)
+                print(f"{filename:<12}{name:<8}{path:<10}{bundles:>10.1f}"
+                      f"{allocated:>12.0f}{peak:>10}{seconds*1000:>8.3f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Measures how the economies scale with the size of generated worlds. For
+every world and economy it times from_config, one evaluation of all the
+participants and a solve with eva, and writes the results as json, so the
+numbers of two commits can be compared. Run it from the root of the
+repository with
+
+    python -m benchmarks.scaling [results.json] [provinces ...]
+"""
+
+import json
+import subprocess
+import sys
+import time
+from typing import Any
+
+import numpy as np
+
+import fast_labor_economy.labor_economy as ne
+import labor_economy.labor_economy as le
+import market.base as mb
+import market.eva as eva
+import wage_economy.wage_economy as we
+from generate_world import WorldParameters, generate_config
+
+PROVINCES = [4, 16, 64]
+EVALUATIONS = 20
+EPSILON = 0.1
+MAX_ITERATIONS = 5000
+
+economies = [
+    ("wage", we.WageEconomy),
+    ("labor", le.LaborEconomy),
+    ("fast labor", ne.LaborEconomy),
+]
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def measure(economy_class, config) -> dict[str, Any]:
+    start = time.perf_counter()
+    economy = economy_class.from_config(config)
+    from_config_seconds = time.perf_counter() - start
+
+    participants = list(economy.participants())
+    p0 = np.full(economy.market_schema().global_width(), 100.0)
+    start = time.perf_counter()
+    for _ in range(EVALUATIONS):
+        mb.one_iteration(participants, p0)
+    participate_seconds = (time.perf_counter() - start) / EVALUATIONS
+
+    eva_config = eva.EvaConfiguration(epsilon=EPSILON,
+                                      rate=0.08,
+                                      first_momentum_mixin=0.09,
+                                      max_iterations=MAX_ITERATIONS)
+    start = time.perf_counter()
+    with np.errstate(all='ignore'):
+        r = eva.make_market(participants, p0, eva_config)
+    solve_seconds = time.perf_counter() - start
+
+    return {
+        "global_width": int(p0.shape[0]),
+        "participants": len(participants),
+        "from_config_seconds": from_config_seconds,
+        "participate_seconds": participate_seconds,
+        "solve_seconds": solve_seconds,
+        "iterations": r.iterations,
+        "timeout": r.timeout,
+        "badness": float(mb.absolute_badness(r.supply)),
+    }
+
+def main() -> int:
+    filename = sys.argv[1] if len(sys.argv) >= 2 else "scaling.json"
+    provinces = [int(a) for a in sys.argv[2:]] or PROVINCES
+    results = []
+    print(f"{'provinces':>10} {'economy':<12}{'from_config':>12}{'participate':>12}"
+          f"{'solve':>10}{'iterations':>11}")
+    for num_provinces in provinces:
+        parameters = WorldParameters(num_provinces=num_provinces)
+        config = generate_config(parameters)
+        for (name, economy_class) in economies:
+            result = measure(economy_class, config)
+            result |= {"provinces": num_provinces,
+                       "economy": name,
+                       "world": parameters.__dict__}
+            results.append(result)
+            iterations = f"{result['iterations']}" + ("+" if result['timeout'] else "")
+            print(f"{num_provinces:>10} {name:<12}"
+                  f"{result['from_config_seconds']:>12.4f}"
+                  f"{result['participate_seconds']:>12.6f}"
+                  f"{result['solve_seconds']:>10.3f}{iterations:>11}")
+    with open(filename, "w", encoding='utf8') as output_stream:
+        json.dump({"commit": git_commit(), "results": results},
+                  output_stream, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Compares how many iterations the market solvers need on the shipped worlds.
+Every iteration is one evaluation of all the participants. Run it from the
+root of the repository with
+
+    python -m benchmarks.solvers [world.json duo.json ...]
+"""
+
+import json
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+
+import fast_labor_economy.labor_economy as ne
+import market.adam as adam
+import market.base as mb
+import market.elastic as el
+import market.eva as eva
+import market.line_search as ls
+import market.newton as newton
+from read_world import read_world
+
+EPSILON = 0.01
+MAX_ITERATIONS = 5000
+
+Solver = Callable[[list[mb.Participant], mb.Prices], eva.Result]
+
+def eva_solver(rate: float = 0.08, **kwargs) -> Solver:
+    config = eva.EvaConfiguration(epsilon=EPSILON,
+                                  rate=rate,
+                                  first_momentum_mixin=0.09,
+                                  max_iterations=MAX_ITERATIONS,
+                                  **kwargs)
+    return lambda participants, p0: eva.make_market(participants, p0, config)
+
+def newton_solver() -> Solver:
+    config = newton.NewtonConfiguration(epsilon=EPSILON,
+                                        max_iterations=MAX_ITERATIONS)
+    return lambda participants, p0: newton.make_market(participants, p0, config)
+
+def adam_solver(**kwargs) -> Solver:
+    config = adam.AdamConfiguration(epsilon=EPSILON,
+                                    max_iterations=MAX_ITERATIONS,
+                                    **kwargs)
+    return lambda participants, p0: adam.make_market(participants, p0, config)
+
+def line_search_solver(**kwargs) -> Solver:
+    config = ls.LineSearchConfiguration(epsilon=EPSILON,
+                                        max_iterations=MAX_ITERATIONS,
+                                        **kwargs)
+    return lambda participants, p0: ls.make_market(participants, p0, config)
+
+def elastic_solver(**kwargs) -> Solver:
+    config = el.ElasticMarketConfiguration(epsilon=EPSILON,
+                                           max_iterations=MAX_ITERATIONS,
+                                           **kwargs)
+    return lambda participants, p0: el.make_market(participants, p0, config)
+
+solvers : list[tuple[str, Solver]] = [
+    ("eva", eva_solver()),
+    ("eva rate 0.01", eva_solver(rate=0.01)),
+    ("eva rate 0.2", eva_solver(rate=0.2)),
+    ("eva anderson 3", eva_solver(anderson_window=3)),
+    ("eva anderson 5", eva_solver(anderson_window=5)),
+    ("eva anderson 8", eva_solver(anderson_window=8)),
+    ("newton", newton_solver()),
+    ("adam", adam_solver()),
+    ("adam 0.003", adam_solver(rate=0.003)),
+    ("adam 0.03", adam_solver(rate=0.03)),
+    ("line search", line_search_solver()),
+    ("line search 0.01", line_search_solver(initial_backoff=0.01)),
+    ("line search 0.2", line_search_solver(initial_backoff=0.2)),
+    ("elastic", elastic_solver()),
+    ("elastic 0.01", elastic_solver(initial_backoff=0.01)),
+    ("elastic 0.2", elastic_solver(initial_backoff=0.2)),
+]
+
+def main() -> int:
+    filenames = sys.argv[1:] or ["world.json", "duo.json"]
+    print(f"{'world':<12}{'solver':<18}{'iterations':>10}{'badness':>14}"
+          f"{'seconds':>10}")
+    for filename in filenames:
+        with open(filename, "r", encoding='utf8') as input_stream:
+            economy_config = read_world(json.load(input_stream))
+        economy = ne.LaborEconomy.from_config(economy_config)
+        participants = list(economy.participants())
+        p0 = np.full(economy.market_schema().global_width(), 100.0)
+        for (name, solver) in solvers:
+            start = time.perf_counter()
+            with np.errstate(all='ignore'):
+                r = solver(participants, p0)
+            seconds = time.perf_counter() - start
+            iterations = f"{r.iterations}" + ("+" if r.timeout else "")
+            print(f"{filename:<12}{name:<18}{iterations:>10}"
+                  f"{mb.absolute_badness(r.supply):>14.4g}{seconds:>10.3f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,17 @@ def consume(utility: Bundle, budget: float, prices: Prices) -> VolumeBundle:
     solution = lambda_squared * utility / (prices * prices)
     return VolumeBundle(-solution, solution)
 
+def consume_blocks(utilities: np.ndarray, budgets: np.ndarray,
+                   local_prices: np.ndarray) -> np.ndarray:
+    """
+    Vectorized version of consume. Row i of utilities and local_prices
+    describes the goods that a consumer with a budget of budgets[i] is able to
+    buy. Returns the consumed quantities in the shape of local_prices.
+    """
+    a = np.sum(utilities / local_prices, axis=-1)
+    lambda_squared = budgets / a
+    return lambda_squared[..., np.newaxis] * utilities / (local_prices * local_prices)
+
 
 class SalaryConsumer():
     def __init__(self, utilities : Bundle, placement : Placement):
@@ -46,7 +57,14 @@ class LaborerConsumer(Participant):
         total_consumption.add_at_slice(self.goods_slice, consumption)
         return total_consumption
 
-class Consumers(Participant):
+    def participate_into(self, prices: Prices, out: VolumeBundle) -> None:
+        consumption_per_pop = consume(self.utilities, prices[self.labor_index],
+                                      prices[self.goods_slice])
+        consumption_per_pop *= self._population
+        out.add_at_ix(self.labor_index, self._population)
+        out.add_at_slice(self.goods_slice, consumption_per_pop)
+
+class Consumers(DifferentiableParticipant):
     def __init__(self, populations: np.ndarray, coefficient_matrix: np.ndarray,
                        labor_indices: np.ndarray):
         self._populations = populations
@@ -54,16 +72,100 @@ class Consumers(Participant):
         self._labor_indices = labor_indices
 
     def participate(self, prices: Prices) -> VolumeBundle:
-        incomes_per_pop = prices[self._labor_indices]
+        # prices may also be a (markets x global width) batch of price vectors
+        incomes_per_pop = prices[..., self._labor_indices]
         # this will broadcast the vector along the rows:
-        preas = self._coefficient_matrix / prices
-        a = np.sum(preas, axis=1)
+        preas = self._coefficient_matrix / prices[..., np.newaxis, :]
+        a = np.sum(preas, axis=-1)
         lambda_squared = incomes_per_pop / a
         # this will broadcast the vector along the rows:
-        pre_div = self._coefficient_matrix / (prices * prices)
-        pre_solution = pre_div * lambda_squared[:, np.newaxis]
-        solution = np.sum(pre_solution * self._populations[:, np.newaxis], axis=0)
-        labor_supply = np.zeros(prices.shape)
+        pre_div = self._coefficient_matrix / (prices * prices)[..., np.newaxis, :]
+        pre_solution = pre_div * lambda_squared[..., np.newaxis]
+        solution = np.sum(pre_solution * self._populations[:, np.newaxis], axis=-2)
+        labor_supply = np.zeros(prices.shape[-1])
         labor_supply[self._labor_indices] = self._populations
 
         return VolumeBundle(-solution + labor_supply, solution + labor_supply)
+
+    def jacobian(self, prices: Prices) -> np.ndarray:
+        # With a = sum(u / p) and x = (w / a) * u / p**2 the demand per pop,
+        # dx_g/dp_h = -2 [g == h] x_g / p_g + x_g u_h / (a p_h**2) and
+        # dx_g/dw = x_g / w. The labor supply does not depend on prices.
+        incomes_per_pop = prices[self._labor_indices]
+        a = np.sum(self._coefficient_matrix / prices, axis=1)
+        lambda_squared = incomes_per_pop / a
+        consumption = (self._populations[:, np.newaxis] * lambda_squared[:, np.newaxis]
+                       * self._coefficient_matrix / (prices * prices))
+        jacobian = -(consumption.T @ (self._coefficient_matrix
+                                      / (a[:, np.newaxis] * prices * prices)))
+        jacobian[np.diag_indices_from(jacobian)] += 2 * np.sum(consumption, axis=0) / prices
+        np.add.at(jacobian, (slice(None), self._labor_indices),
+                  -(consumption / incomes_per_pop[:, np.newaxis]).T)
+        return jacobian
+
+class BlockConsumers(DifferentiableParticipant):
+    """
+    Implements the same consumers as Consumers. But every province only buys
+    the goods in its own block, so we store the utilities as a compact
+    (provinces x local goods) matrix together with the listings of these goods
+    instead of as a dense (provinces x global width) matrix.
+    """
+
+    def __init__(self, populations: np.ndarray, utilities: np.ndarray,
+                       goods_indices: np.ndarray, labor_indices: np.ndarray):
+        assert utilities.shape == goods_indices.shape
+        assert populations.shape == labor_indices.shape == utilities.shape[:1]
+        self._populations = populations
+        self._utilities = utilities
+        self._goods_indices = goods_indices
+        self._labor_indices = labor_indices
+
+    def population(self, province: int) -> int:
+        return self._populations[province]
+
+    def set_population(self, province: int, population: int) -> None:
+        self._populations = writable(self._populations)
+        self._populations[province] = population
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """The arguments of the constructor, used to store the consumers."""
+        return {"populations": self._populations,
+                "utilities": self._utilities,
+                "goods_indices": self._goods_indices,
+                "labor_indices": self._labor_indices}
+
+    def participate(self, prices: Prices) -> VolumeBundle:
+        # prices may also be a (markets x global width) batch of price vectors
+        width = prices.shape[-1]
+        incomes_per_pop = prices[..., self._labor_indices]
+        local_prices = prices[..., self._goods_indices]
+        consumption_per_pop = consume_blocks(self._utilities, incomes_per_pop,
+                                             local_prices)
+        consumption = self._populations[:, np.newaxis] * consumption_per_pop
+        solution = scatter_add(self._goods_indices, consumption, width)
+        labor_supply = scatter_add(self._labor_indices, self._populations, width)
+
+        return VolumeBundle(-solution + labor_supply, solution + labor_supply)
+
+    def jacobian(self, prices: Prices) -> np.ndarray:
+        # Same derivatives as in Consumers.jacobian, but every province
+        # contributes a block over its goods followed by its labor listing.
+        (num_provinces, local_width) = self._utilities.shape
+        incomes_per_pop = prices[self._labor_indices]
+        local_prices = prices[self._goods_indices]
+        a = np.sum(self._utilities / local_prices, axis=1)
+        consumption_per_pop = consume_blocks(self._utilities, incomes_per_pop,
+                                             local_prices)
+        consumption = self._populations[:, np.newaxis] * consumption_per_pop
+
+        blocks = np.zeros((num_provinces, local_width + 1, local_width + 1))
+        marginal = self._utilities / (a[:, np.newaxis] * local_prices * local_prices)
+        blocks[:, :local_width, :local_width] = -(consumption[:, :, np.newaxis]
+                                                  * marginal[:, np.newaxis, :])
+        goods = np.arange(local_width)
+        blocks[:, goods, goods] += 2 * consumption / local_prices
+        blocks[:, :local_width, local_width] = -(consumption
+                                                 / incomes_per_pop[:, np.newaxis])
+        indices = np.concatenate([self._goods_indices,
+                                  self._labor_indices[:, np.newaxis]], axis=1)
+        return scatter_jacobian(indices, blocks, prices.shape[0])
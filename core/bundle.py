@@ -2,6 +2,33 @@ import numpy as np
 
 Bundle = np.ndarray
 
+def scatter_add(indices : np.ndarray, weights : np.ndarray, width : int) -> Bundle:
+    """
+    Sums the weights into a vector of the given width, where weights[i] is
+    added at position indices[i]. Indices may repeat. If weights has more
+    dimensions than indices, then the leading dimensions are treated as a
+    batch and the result has the shape batch_shape + (width,).
+    """
+    batch_shape = np.shape(weights)[:np.ndim(weights) - np.ndim(indices)]
+    if not batch_shape:
+        return np.bincount(np.ravel(indices), weights=np.ravel(weights),
+                           minlength=width)
+    batch_size = int(np.prod(batch_shape))
+    offsets = width * np.arange(batch_size)[:, np.newaxis]
+    flat_indices = offsets + np.ravel(indices)[np.newaxis, :]
+    sums = np.bincount(flat_indices.ravel(), weights=np.ravel(weights),
+                       minlength=batch_size * width)
+    return sums.reshape(batch_shape + (width,))
+
+def writable(array : np.ndarray) -> np.ndarray:
+    """
+    Returns array if it can be changed in place and a copy of it otherwise,
+    for example if it is memory mapped from a read only file.
+    """
+    if array.flags.writeable:
+        return array
+    return np.array(array)
+
 class VolumeBundle:
     def __init__(self, error, double_volume):
         assert np.shape(error) == np.shape(double_volume)
@@ -16,6 +43,20 @@ class VolumeBundle:
     def shape(self):
         return self.error.shape
 
+    def clear(self) -> None:
+        self.error.fill(0)
+        self.double_volume.fill(0)
+
+    def copy(self):
+        return VolumeBundle(self.error.copy(), self.double_volume.copy())
+
+    def __getitem__(self, key):
+        """
+        Selects markets of a batched bundle, where every row of error and
+        double_volume belongs to a different market.
+        """
+        return VolumeBundle(self.error[key], self.double_volume[key])
+
     def __add__(self, other):
         assert isinstance(other, VolumeBundle)
         assert other.shape() == self.shape()
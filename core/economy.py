@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Type, TypeVar, Iterable
+from typing import Type, TypeVar, Iterable, Iterator
+import numpy as np
 import numpy.typing as npt
 
 from core.participant import Participant
@@ -19,12 +20,42 @@ class TradeConfig:
     to_province: ProvinceId
     trade_factor: float
 
+@dataclass
+class TradeRoutes:
+    """
+    Stores many TradeConfigs as columns. Iterating over it yields the
+    TradeConfigs, but code that builds matrices can use the columns directly.
+    """
+    goods: npt.NDArray
+    from_provinces: npt.NDArray
+    to_provinces: npt.NDArray
+    trade_factors: npt.NDArray
+
+    @classmethod
+    def from_configs(cls, configs: Iterable[TradeConfig]):
+        if isinstance(configs, TradeRoutes):
+            return configs
+        configs = list(configs)
+        n = len(configs)
+        return cls(np.fromiter((tc.good for tc in configs), int, n),
+                   np.fromiter((tc.from_province for tc in configs), int, n),
+                   np.fromiter((tc.to_province for tc in configs), int, n),
+                   np.fromiter((tc.trade_factor for tc in configs), float, n))
+
+    def __len__(self) -> int:
+        return self.goods.shape[0]
+
+    def __iter__(self) -> Iterator[TradeConfig]:
+        columns = zip(self.goods.tolist(), self.from_provinces.tolist(),
+                      self.to_provinces.tolist(), self.trade_factors.tolist())
+        return (TradeConfig(*column) for column in columns)
+
 @dataclass
 class ProvinceConfig:
     population: int
     utilities: Bundle
     factories: list[FactoryConfig]
-    merchants: list[TradeConfig]
+    merchants: list[TradeConfig] | TradeRoutes
 
 @dataclass
 class EconomyConfig:
@@ -10,3 +10,31 @@ class Participant(ABC):
     def participate(self, prices : Prices) -> VolumeBundle:
         ...
 
+    def participate_into(self, prices : Prices, out : VolumeBundle) -> None:
+        """
+        Adds the result of participate to out. Participants that only touch
+        a few listings override this to avoid allocating a bundle of the
+        global width.
+        """
+        out += self.participate(prices)
+
+class DifferentiableParticipant(Participant):
+    @abstractmethod
+    def jacobian(self, prices : Prices) -> np.ndarray:
+        """
+        Returns the derivative of the error of participate at the given prices
+        as a (global width x global width) matrix, where entry (i, j) is the
+        derivative of the error of listing i by the price of listing j.
+        """
+        ...
+
+def scatter_jacobian(indices : np.ndarray, blocks : np.ndarray,
+                     width : int) -> np.ndarray:
+    """
+    Sums small dense blocks into a (width x width) jacobian. Entry (b, i, j)
+    of blocks is added at position (indices[b, i], indices[b, j]).
+    """
+    flat_indices = indices[:, :, np.newaxis] * width + indices[:, np.newaxis, :]
+    sums = np.bincount(flat_indices.ravel(), weights=blocks.ravel(),
+                       minlength=width * width)
+    return sums.reshape((width, width))
@@ -12,6 +12,7 @@ class GoodsSchema:
     def __init__(self, good_names : list[str]):
         self._good_names = good_names
         self._num_goods = len(self._good_names)
+        self._good_ids = {name: good for (good, name) in enumerate(good_names)}
 
     def valid_id(self, good_id: GoodId) -> bool:
         return 0 <= good_id < self.width()
@@ -26,7 +27,10 @@ class GoodsSchema:
     ix_to_str = name_of_good
 
     def good_of_name(self, name : str) -> GoodId:
-        return self._good_names.index(name)
+        return self._good_ids[name]
+
+    def goods_of_names(self, names : Iterable[str]) -> np.ndarray:
+        return np.fromiter((self._good_ids[name] for name in names), int)
 
     #def placement(self) -> Placement:
     #    return Placement(self.__num_goods, slice(0, self._num_goods))
@@ -40,7 +44,7 @@ class GoodsSchema:
     def dict_to_vector(self, dictionary: dict[str ,float]) -> np.ndarray:
         v = np.zeros(self.production_width())
         for name, value in dictionary.items():
-            v[self._good_names.index(name)] = value
+            v[self._good_ids[name]] = value
         return v
 
     def list_of_names(self) -> list[str]:
@@ -97,6 +101,8 @@ class ProvinceSchema:
     def __init__(self, province_names : Iterable[str]):
         self._province_names = list(province_names);
         self._num_provinces = len(self._province_names)
+        self._province_ids = {name: province for (province, name)
+                              in enumerate(self._province_names)}
 
     def valid_id(self, province_id: ProvinceId) -> bool:
         return 0 <= province_id < self.num_provinces()
@@ -109,7 +115,10 @@ class ProvinceSchema:
         return self._province_names[province]
 
     def province_of_name(self, name : str) -> ProvinceId:
-        return self._province_names.index(name)
+        return self._province_ids[name]
+
+    def provinces_of_names(self, names : Iterable[str]) -> np.ndarray:
+        return np.fromiter((self._province_ids[name] for name in names), int)
 
     def list_of_names(self) -> list[str]:
         return self._province_names
@@ -164,6 +173,7 @@ class MarketPriceSchema:
                          self.production_slice_in_province(province))
 
     def decompose(self, listingId: ListingId) -> tuple[ProvinceId, GoodId]:
+        # also works elementwise for an array of listings
         w = self.local_width()
         (provinceId,goodId) = divmod(listingId, w)
         return (provinceId, goodId)
@@ -174,31 +184,36 @@ class MarketPriceSchema:
         goodName = self.local_schema().name_of_good(goodId)
         return goodName + " in " + provinceName
 
+    def listings_of(self, goods: Optional[Iterable[str]],
+                    provinces: Optional[Iterable[str]],
+                    goods_major: bool = False) -> np.ndarray:
+        """
+        Returns the listings of all the given goods in all the given
+        provinces, where None stands for all of them. The listings are ordered
+        by province and then by good, or the other way round if goods_major.
+        """
+        if goods == None:
+            good_ids = np.arange(self.local_schema().width())
+        else:
+            good_ids = self.local_schema().goods_of_names(goods)
+        if provinces == None:
+            province_ids = np.arange(self.province_schema().num_provinces())
+        else:
+            province_ids = self.province_schema().provinces_of_names(provinces)
+        starts = province_ids * self.local_width()
+        if goods_major:
+            return (good_ids[:, np.newaxis] + starts[np.newaxis, :]).ravel()
+        return (starts[:, np.newaxis] + good_ids[np.newaxis, :]).ravel()
+
     def list_goods_in_provinces(self,
                                 goods: Optional[Iterable[str]],
                                 provinces: Optional[Iterable[str]]) -> Iterable[ListingId]:
-        if goods == None:
-            goods = self.local_schema()._good_names
-        if provinces == None:
-            provinces = self.province_schema()._province_names
-        for province_name in provinces:
-            province_id = self.province_schema().province_of_name(province_name)
-            for good_name in goods:
-                good_id = self.local_schema().good_of_name(good_name)
-                yield self.good_in_province(good_id, province_id)
+        return self.listings_of(goods, provinces).tolist()
 
     def list_provinces_over_goods(self,
                                   goods: Optional[Iterable[str]],
                                   provinces: Optional[Iterable[str]]) -> Iterable[ListingId]:
-        if goods == None:
-            goods = self.local_schema()._good_names
-        if provinces == None:
-            provinces = self.province_schema()._province_names
-        for good_name in goods:
-            good_id = self.local_schema().good_of_name(good_name)
-            for province_name in provinces:
-                province_id = self.province_schema().province_of_name(province_name)
-                yield self.good_in_province(good_id, province_id)
+        return self.listings_of(goods, provinces, goods_major=True).tolist()
 
     #def ix_list_provinces_major():
 
@@ -0,0 +1,149 @@
+"""
+Stores the equilibrium prices of solved economies on disk, so later solves
+of the same or of a similar economy can start close to their equilibrium.
+
+Every entry is an .npz file named after the structure of the economy, which
+is the hash of its schema and of its arrays. It holds the prices and the
+arrays of the economy, which are used to find the nearest entry if there is
+no entry with the same structure. Next to it a small .json file with the
+schema serves as the index of the store, so looking for the nearest entry
+only loads the arrays of the entries with the same schema.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Optional, Protocol
+
+import numpy as np
+
+from core.schema import MarketPriceSchema
+from world_cache import schema_from_json, schema_to_json
+
+STORE_DIRECTORY = ".equilibria"
+ARRAY_PREFIX = "economy."
+
+class StorableEconomy(Protocol):
+    def market_schema(self) -> MarketPriceSchema:
+        ...
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        ...
+
+def structure_key(economy: StorableEconomy) -> str:
+    digest = hashlib.sha256()
+    digest.update(json.dumps(schema_to_json(economy.market_schema())).encode())
+    for (name, array) in sorted(economy.to_arrays().items()):
+        array = np.ascontiguousarray(array)
+        digest.update(f"{name}:{array.dtype}:{array.shape}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+def listings_by_name(market_schema: MarketPriceSchema) -> dict[tuple[str, str], int]:
+    # the listing of every (province, good), including labor
+    goods = market_schema.local_schema().list_of_names()
+    return {(province, good): market_schema.listing_of_good_in_province(good, province)
+            for province in market_schema.province_schema().list_of_names()
+            for good in goods}
+
+def array_distance(arrays: dict[str, np.ndarray],
+                   other: dict[str, np.ndarray]) -> float:
+    """
+    Relative L1 distance between the arrays of two economies, infinite if
+    they do not have the same arrays of the same shapes.
+    """
+    if arrays.keys() != other.keys():
+        return np.inf
+    difference = 0.0
+    size = 0.0
+    for (name, array) in arrays.items():
+        if array.shape != other[name].shape:
+            return np.inf
+        difference += np.sum(np.abs(array - other[name]))
+        size += np.sum(np.abs(array))
+    return difference / max(size, 1e-12)
+
+class EquilibriumStore:
+    def __init__(self, directory: str = STORE_DIRECTORY):
+        self._directory = directory
+
+    def _path(self, key: str, ending: str = ".npz") -> str:
+        return os.path.join(self._directory, key + ending)
+
+    def _index(self) -> list[tuple[str, dict[str, Any]]]:
+        """The key and the json schema of every entry."""
+        if not os.path.isdir(self._directory):
+            return []
+        index = []
+        for filename in os.listdir(self._directory):
+            (key, ending) = os.path.splitext(filename)
+            if ending == ".json":
+                with open(os.path.join(self._directory, filename), "r",
+                          encoding='utf8') as input_stream:
+                    index.append((key, json.load(input_stream)))
+        return index
+
+    def save(self, economy: StorableEconomy, price: np.ndarray) -> None:
+        os.makedirs(self._directory, exist_ok=True)
+        arrays = {ARRAY_PREFIX + name: array
+                  for (name, array) in economy.to_arrays().items()}
+        key = structure_key(economy)
+        path = self._path(key)
+        # np.savez appends .npz to names without it, so the temporary file
+        # keeps the ending
+        temporary = path + f".{os.getpid()}.npz"
+        np.savez(temporary, price=price, **arrays)
+        os.replace(temporary, path)
+        # the index file is written last, so every indexed entry is complete
+        temporary = self._path(key, f".{os.getpid()}.tmp")
+        with open(temporary, "w", encoding='utf8') as output_stream:
+            json.dump(schema_to_json(economy.market_schema()), output_stream)
+        os.replace(temporary, self._path(key, ".json"))
+
+    def initial_price(self, economy: StorableEconomy,
+                      default: float = 100.0) -> np.ndarray:
+        """
+        Returns the prices to start the solve of economy with. These are the
+        stored prices of the same structure if there are any. Otherwise they
+        are the prices of the nearest economy with the same schema, or the
+        prices mapped by province and good name from the stored economy that
+        shares the most listings. Listings without a stored price get the
+        default price.
+        """
+        market_schema = economy.market_schema()
+        price = np.full(market_schema.global_width(), default)
+        exact = self._path(structure_key(economy))
+        if os.path.isfile(exact):
+            with np.load(exact) as entry:
+                return np.array(entry["price"], dtype=float)
+
+        json_schema = schema_to_json(market_schema)
+        listings = listings_by_name(market_schema)
+        arrays = economy.to_arrays()
+        best : Optional[tuple[float, float, str, dict[str, Any]]] = None
+        for (key, stored_schema) in self._index():
+            if stored_schema == json_schema:
+                with np.load(self._path(key)) as entry:
+                    stored_arrays = {name[len(ARRAY_PREFIX):]: entry[name]
+                                     for name in entry.files
+                                     if name.startswith(ARRAY_PREFIX)}
+                distance = array_distance(arrays, stored_arrays)
+                shared = len(listings)
+            else:
+                distance = np.inf
+                stored_listings = listings_by_name(schema_from_json(stored_schema))
+                shared = len(listings.keys() & stored_listings.keys())
+            # more shared listings are better, then smaller distances
+            candidate = (-shared, distance)
+            if shared > 0 and (best is None or candidate < best[:2]):
+                best = (-shared, distance, key, stored_schema)
+        if best is None:
+            return price
+        (_, _, key, stored_schema) = best
+        with np.load(self._path(key)) as entry:
+            stored_price = np.array(entry["price"], dtype=float)
+        stored_listings = listings_by_name(schema_from_json(stored_schema))
+        for (name, listing) in listings.items():
+            if name in stored_listings:
+                price[listing] = stored_price[stored_listings[name]]
+        return price
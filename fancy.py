@@ -194,10 +194,9 @@ def run_ls():
                 necessary_improvement=1,
                 necessary_improvement_decay = 0.95,
                 price_scaling=scaling)
-    p = ls.make_market(participants, p0, config)
-    print(f"lis iterations: {get_iteration()}")
-    pt.pretty_table([("price", p)])
-    reset_iteration()
+    r = ls.make_market(participants, p0, config)
+    print(f"lis iterations: {r.iterations}")
+    pt.pretty_table([("price", r.price)])
 
 def run_el():
     config = el.ElasticMarketConfiguration(
@@ -211,11 +210,10 @@ def run_el():
                 #price_scaling=scaling
                 price_scaling=None
              )
-    p = el.make_market(participants, p0, config)
-    p = apply_price_scaling(p, scaling)
+    r = el.make_market(participants, p0, config)
+    p = apply_price_scaling(r.price, scaling)
     pt.pretty_table([("price", p)])
-    print(f"ads iterations: {get_iteration()}")
-    reset_iteration()
+    print(f"ads iterations: {r.iterations}")
 
 def run_eva():
     config = eva.EvaConfiguration(
@@ -223,24 +221,22 @@ def run_eva():
              rate=0.03,
              first_momentum_mixin = 0.025
     )
-    p = eva.make_market(participants, p0, config)
-    p = apply_price_scaling(p, scaling)
+    r = eva.make_market(participants, p0, config)
+    p = apply_price_scaling(r.price, scaling)
     pt.pretty_table([("price", p)])
-    print(f"eva iterations: {get_iteration()}")
-    reset_iteration()
+    print(f"eva iterations: {r.iterations}")
 
 def run_adam():
     config = adam.AdamConfiguration(
                 epsilon=epsilon,
-                rate=0.00001,
-                first_momentum_mixin = 0.02,
-                second_momentum_mixin = 0.0001
+                rate=0.01,
+                first_momentum_mixin = 0.05,
+                second_momentum_mixin = 0.001
              )
-    p = adam.make_market(participants, p0, config)
-    p = apply_price_scaling(p, scaling)
+    r = adam.make_market(participants, p0, config)
+    p = apply_price_scaling(r.price, scaling)
     pt.pretty_table([("price", p)])
-    print(f"eva iterations: {get_iteration()}")
-    reset_iteration()
+    print(f"adam iterations: {r.iterations}")
 
 
 run_eva()
@@ -0,0 +1,111 @@
+from typing import Iterable
+from collections import defaultdict
+import numpy as np
+
+import consumer as c
+import fast_labor_economy.producer as p
+import labor_economy.producer as lp
+from core.participant import Participant
+
+def is_trader(producer: lp.Producer) -> bool:
+    """
+    A producer is a trader if it buys a good at one listing and sells the
+    same amount at another one.
+    """
+    coefficients = producer.support_coefficients
+    return (coefficients.shape == (2,)
+            and coefficients[0] == -coefficients[1])
+
+def pad_rows(rows: list[np.ndarray], fill_rows: list, width: int) -> np.ndarray:
+    """
+    Stacks rows of different lengths into a (rows x width) matrix, where row
+    i is padded with fill_rows[i].
+    """
+    result = np.array([np.full(width, fill, dtype=np.asarray(row).dtype)
+                       for (row, fill) in zip(rows, fill_rows)])
+    for (i, row) in enumerate(rows):
+        result[i, :len(row)] = row
+    return result.reshape((len(rows), width))
+
+def compile_consumers(consumers: list[c.LaborerConsumer]) -> c.BlockConsumers:
+    # provinces with fewer goods are padded with goods of utility 0
+    goods_indices = [np.arange(consumer.goods_slice.start, consumer.goods_slice.stop)
+                     for consumer in consumers]
+    width = max(len(indices) for indices in goods_indices)
+    first_goods = [indices[0] for indices in goods_indices]
+    populations = np.array([consumer.population() for consumer in consumers])
+    utilities = pad_rows([np.asarray(consumer.utilities, dtype=float)
+                          for consumer in consumers],
+                         [0.0] * len(consumers), width)
+    labor_indices = np.array([consumer.labor_index for consumer in consumers],
+                             dtype=int)
+    return c.BlockConsumers(populations, utilities,
+                            pad_rows(goods_indices, first_goods, width),
+                            labor_indices)
+
+def compile_traders(traders: list[lp.Producer]) -> p.Traders:
+    # the good is bought at the listing with the negative coefficient
+    def route(trader: lp.Producer) -> tuple[int, int, float, int]:
+        (first, second) = trader.support
+        (first_coefficient, second_coefficient) = trader.support_coefficients
+        if first_coefficient < 0:
+            return (first, second, second_coefficient, trader.labor_index)
+        return (second, first, first_coefficient, trader.labor_index)
+    routes = list(map(route, traders))
+    return p.Traders(np.fromiter((r[0] for r in routes), int, len(routes)),
+                     np.fromiter((r[1] for r in routes), int, len(routes)),
+                     np.fromiter((r[2] for r in routes), float, len(routes)),
+                     np.fromiter((r[3] for r in routes), int, len(routes)))
+
+def compile_factories(factories: list[lp.Producer]) -> p.Factories:
+    # Factories groups the rows by their labor listing. The goods of a group
+    # are the union of the supports of its producers, padded to a common
+    # width with goods of coefficient 0.
+    groups : dict[int, list[lp.Producer]] = defaultdict(list)
+    for factory in factories:
+        groups[factory.labor_index].append(factory)
+    labor_indices = np.fromiter(groups.keys(), int, len(groups))
+    supports = [np.unique(np.concatenate([f.support for f in group]))
+                for group in groups.values()]
+    local_width = max(len(support) for support in supports)
+    num_factories = max(len(group) for group in groups.values())
+    goods_indices = pad_rows(supports, [support[0] for support in supports],
+                             local_width)
+    coefficients = np.zeros((len(groups), num_factories, local_width))
+    for (g, group) in enumerate(groups.values()):
+        for (f, factory) in enumerate(group):
+            columns = np.searchsorted(supports[g], factory.support)
+            coefficients[g, f, columns] = factory.support_coefficients
+    return p.Factories(coefficients, goods_indices, labor_indices)
+
+def compile_participants(participants: Iterable[Participant]) -> list[Participant]:
+    """
+    Fuses the LaborerConsumers and Producers of an economy that was built
+    object by object into the vectorized engines of the fast labor economy.
+    Producers that trade one good between two listings become Traders, the
+    other producers become Factories. Producers that never trade anything are
+    dropped and all other participants are passed through unchanged.
+    """
+    consumers = []
+    traders = []
+    factories = []
+    others = []
+    for participant in participants:
+        if isinstance(participant, c.LaborerConsumer):
+            consumers.append(participant)
+        elif isinstance(participant, lp.Producer):
+            if is_trader(participant):
+                traders.append(participant)
+            elif participant.support.size > 0:
+                factories.append(participant)
+        else:
+            others.append(participant)
+
+    compiled : list[Participant] = []
+    if consumers:
+        compiled.append(compile_consumers(consumers))
+    if factories:
+        compiled.append(compile_factories(factories))
+    if traders:
+        compiled.append(compile_traders(traders))
+    return compiled + others
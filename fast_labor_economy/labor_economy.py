@@ -1,17 +1,15 @@
-from typing import List, Iterable, Callable
+from typing import Iterable
 from itertools import chain
-import math
 import numpy as np
 
 import consumer as c
 import fast_labor_economy.producer as p
+from core.bundle import Bundle
 from core.participant import Participant
-from core.schema import LaborTradeGoodsSchema, LaborMarketPriceSchema, ProvinceId
+from core.schema import (GoodId, LaborTradeGoodsSchema, LaborMarketPriceSchema,
+                         ProvinceId)
 import core.economy as economy
 
-def uncurry(function: Callable):
-    return lambda args: function(*args)
-
 class LaborEconomy(economy.Economy):
     """
     Implements the economy interface for algorithms in which labor is one of
@@ -19,116 +17,171 @@ class LaborEconomy(economy.Economy):
     """
 
     def __init__(self, market_schema: LaborMarketPriceSchema,
-                       consumers: c.Consumers,
-                       producers: p.Producers):
+                       consumers: c.BlockConsumers,
+                       factories: p.Factories,
+                       traders: p.Traders):
         self._market_schema = market_schema
         self._consumers = consumers
-        self._producers = producers
+        self._factories = factories
+        self._traders = traders
 
     @classmethod
     def from_config(cls, config: economy.EconomyConfig):
         market_schema = LaborMarketPriceSchema(
             LaborTradeGoodsSchema(config.goods_schema),
             config.province_schema)
+        province_configs = config.province_configs
+        num_provinces = len(province_configs)
+        local_width = market_schema.local_width()
+        production_width = market_schema.local_schema().production_width()
+
+        # we only collect columns from the config, the participants are then
+        # assembled from them in bulk
+        populations = np.fromiter((pc.population for pc in province_configs),
+                                  int, num_provinces)
+        utilities = np.array([pc.utilities for pc in province_configs],
+                             dtype=float).reshape((num_provinces, production_width))
+        factory_rows = [fc.production_coefficients
+                        for pc in province_configs for fc in pc.factories]
+        factory_counts = np.fromiter((len(pc.factories) for pc in province_configs),
+                                     int, num_provinces)
+        routes = [economy.TradeRoutes.from_configs(pc.merchants)
+                  for pc in province_configs]
+        route_counts = np.fromiter(map(len, routes), int, num_provinces)
+
+        # the listings of the goods and labor of province i start at
+        # i * local_width
+        starts = local_width * np.arange(num_provinces)
+        goods_indices = starts[:, np.newaxis] + np.arange(production_width)
+        labor_indices = starts + market_schema.local_schema().labour()
+        # need to scale the production coefficients such that factories in
+        # big provinces can produce with the same efficiency per worker as
+        # factories in small provinces. We can think of this as meaning that
+        # big provinces have larger factories.
+        sqrt_populations = np.sqrt(populations)
+
+        consumers = c.BlockConsumers(populations, utilities, goods_indices,
+                                     labor_indices)
+
+        # the factories of a province only use the goods of that province, so
+        # we store them as blocks of a (provinces x factories x goods) tensor
+        num_factories = int(factory_counts.max(initial=0))
+        factory_provinces = np.repeat(np.arange(num_provinces), factory_counts)
+        first_factory = np.cumsum(factory_counts) - factory_counts
+        factory_slots = (np.arange(factory_provinces.size)
+                         - first_factory[factory_provinces])
+        coefficients = np.zeros((num_provinces, num_factories, production_width))
+        if factory_rows:
+            coefficients[factory_provinces, factory_slots] = (
+                sqrt_populations[factory_provinces, np.newaxis]
+                * np.array(factory_rows, dtype=float))
+        factories = p.Factories(coefficients, goods_indices, labor_indices)
+
+        # every merchant only touches two listings, so we store them as a list
+        # of routes instead of as rows of the production matrix. Merchants
+        # work in the province whose config lists them.
+        home_provinces = np.repeat(np.arange(num_provinces), route_counts)
+        def column(name: str, dtype) -> np.ndarray:
+            return np.concatenate([np.asarray(getattr(r, name), dtype=dtype)
+                                   for r in routes] + [np.zeros(0, dtype=dtype)])
+        route_goods = column("goods", int)
+        from_indices = starts[column("from_provinces", int)] + route_goods
+        to_indices = starts[column("to_provinces", int)] + route_goods
+        efficiencies = (sqrt_populations[home_provinces]
+                        * column("trade_factors", float))
+        traders = p.Traders(from_indices, to_indices, efficiencies,
+                            labor_indices[home_provinces])
+
+        return cls(market_schema, consumers, factories, traders)
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """
+        Returns all the arrays of the participants, so the economy can be
+        restored with from_arrays without going through its config.
+        """
+        parts = [("consumers", self._consumers), ("factories", self._factories),
+                 ("traders", self._traders)]
+        return {f"{part}.{name}": array
+                for (part, participant) in parts
+                for (name, array) in participant.arrays().items()}
 
-#"""
-#        def create_consumer(province: ProvinceId,
-#                            config: economy.ProvinceConfig) -> c.LaborerConsumer:
-#            return c.LaborerConsumer(config.utilities, config.population,
-#                                     market_schema.labor_placement_of_province(province))
-#        consumers = list(map(uncurry(create_consumer), enumerate(config.province_configs)))
-#"""
-
-        def population_for_province(province: ProvinceId,
-                                    province_config: economy.ProvinceConfig) -> Iterable[int]:
-            return province_config.population
-        population_iter = map(uncurry(population_for_province),
-                              enumerate(config.province_configs))
-        populations = np.fromiter(population_iter, int)
-
-        def utilities_for_province(province: ProvinceId,
-                                   province_config: economy.ProvinceConfig
-                                   ) -> Iterable[np.ndarray]:
-            row = np.zeros(market_schema.global_width())
-            sl = market_schema.labor_placement_of_province(province).production_slice
-            row[sl] += province_config.utilities
-            return row
-        utilities_iter = map(uncurry(utilities_for_province),
-                              enumerate(config.province_configs))
-        utilities = np.fromiter(utilities_iter, (float, market_schema.global_width()))
-
-        def labor_index_for_province(province: ProvinceId,
-                                     province_config: economy.ProvinceConfig
-                                     ) -> Iterable[int]:
-            labor_index = market_schema.labor_placement_of_province(province).labor_index
-            return labor_index
-        index_iter = map(uncurry(labor_index_for_province),
-                         enumerate(config.province_configs))
-        labor_indices = np.fromiter(index_iter, int)
-
-        consumers = c.Consumers(populations, utilities, labor_indices)
-
-        def production_rows_for_province(province: ProvinceId,
-                                         province_config: economy.ProvinceConfig
-                                        ) -> Iterable[np.ndarray]:
-            sqrt_population = math.sqrt(province_config.population)
-            def create_factory(factory_config: economy.FactoryConfig) -> np.ndarray:
-                slice_of_province = market_schema.production_slice_in_province(province)
-                row = np.zeros(market_schema.global_width())
-                # need to scale the production coefficients such that factories
-                # in big provinces can produce with the same efficiency per
-                # worker as factories in small provinces. We can think of this
-                # as meaning that big provinces have larger factories.
-                coefficients = sqrt_population * factory_config.production_coefficients
-                row[slice_of_province] = coefficients
-                return row
-            factoryiter = map(create_factory, province_config.factories)
-
-            def create_trader(trade_config: economy.TradeConfig) -> np.ndarray:
-                row = np.zeros(market_schema.global_width())
-                from_listing = market_schema.good_in_province(trade_config.good,
-                                                              trade_config.from_province)
-                to_listing = market_schema.good_in_province(trade_config.good,
-                                                            trade_config.to_province)
-                trade_efficiency = sqrt_population * trade_config.trade_factor
-                row[from_listing] = -trade_efficiency
-                row[to_listing] = trade_efficiency
-                return row
-            traderiter = map(create_trader, province_config.merchants)
-            return chain(factoryiter, traderiter)
-
-        nested_producers = map(uncurry(production_rows_for_province),
-                               enumerate(config.province_configs))
-        production_iter = chain(*nested_producers)
-        production_matrix = np.fromiter(production_iter,
-                                        (float, market_schema.global_width()))
-
-        def labor_indices_for_province(province: ProvinceId,
-                                       province_config: economy.ProvinceConfig
-                                      ) -> Iterable[int]:
-            labor_index = market_schema.labor_placement_of_province(province).labor_index
-            def create_factory(factory_config: economy.FactoryConfig) -> int:
-                return labor_index
-            factoryiter = map(create_factory, province_config.factories)
-
-            def create_trader(trade_config: economy.TradeConfig) -> int:
-                return labor_index
-            traderiter = map(create_trader, province_config.merchants)
-            return chain(factoryiter, traderiter)
-        nested_indices = map(uncurry(labor_indices_for_province),
-                             enumerate(config.province_configs))
-        index_iter = chain(*nested_indices)
-        labor_indices = np.fromiter(index_iter, int)
-
-        producers = p.Producers(production_matrix, labor_indices)
-
-        return cls(market_schema, consumers, producers)
+    @classmethod
+    def from_arrays(cls, market_schema: LaborMarketPriceSchema,
+                    arrays: dict[str, np.ndarray]):
+        def arrays_of(part: str) -> dict[str, np.ndarray]:
+            prefix = part + "."
+            return {name[len(prefix):]: array for (name, array) in arrays.items()
+                    if name.startswith(prefix)}
+        return cls(market_schema,
+                   c.BlockConsumers(**arrays_of("consumers")),
+                   p.Factories(**arrays_of("factories")),
+                   p.Traders(**arrays_of("traders")))
 
     def population_in_province(self, province: ProvinceId) -> int:
-        return self._consumers[province].population()
+        return self._consumers.population(province)
+
+    # The following methods change the built economy in place, so what-if
+    # edits only touch the rows of the changed province, factory or route
+    # instead of going through from_config again.
+
+    def set_population(self, province: ProvinceId, population: int) -> None:
+        """
+        Sets the population of a province and rescales its factories and
+        merchants by the square root of the change, like from_config does.
+        """
+        old_population = self._consumers.population(province)
+        assert old_population > 0 and population > 0
+        factor = np.sqrt(population / old_population)
+        self._consumers.set_population(province, population)
+        self._factories.scale_province(province, factor)
+        self._traders.scale_routes(
+            self._traders.routes_of_labor(
+                self._market_schema.labor_placement_of_province(province).labor_index),
+            factor)
+
+    def scale_trade_factor(self, good: GoodId, factor: float) -> None:
+        """Multiplies the trade factors of all routes of a good by factor."""
+        # the routes are looked up by the listing of the good in every
+        # province they buy in
+        num_provinces = self._market_schema.province_schema().num_provinces()
+        routes = np.concatenate([self._traders.routes_from(
+                                     self._market_schema.good_in_province(good, province))
+                                 for province in range(num_provinces)])
+        self._traders.scale_routes(routes, factor)
+
+    def add_factory(self, province: ProvinceId,
+                    production_coefficients: Bundle) -> int:
+        """
+        Adds a factory to a province and returns its slot, which identifies
+        it for remove_factory.
+        """
+        coefficients = (np.sqrt(self._consumers.population(province))
+                        * np.asarray(production_coefficients, dtype=float))
+        return self._factories.add_factory(province, coefficients)
+
+    def remove_factory(self, province: ProvinceId, slot: int) -> None:
+        self._factories.remove_factory(province, slot)
+
+    def add_route(self, merchant: economy.TradeConfig,
+                  home_province: ProvinceId) -> int:
+        """
+        Adds a merchant working in home_province and returns its route
+        number, which identifies it for remove_route.
+        """
+        efficiency = (np.sqrt(self._consumers.population(home_province))
+                      * merchant.trade_factor)
+        market_schema = self._market_schema
+        return self._traders.add_route(
+            market_schema.good_in_province(merchant.good, merchant.from_province),
+            market_schema.good_in_province(merchant.good, merchant.to_province),
+            efficiency,
+            market_schema.labor_placement_of_province(home_province).labor_index)
+
+    def remove_route(self, route: int) -> None:
+        self._traders.remove_route(route)
 
     def market_schema(self) -> LaborMarketPriceSchema:
         return self._market_schema
 
     def participants(self) -> Iterable[Participant]:
-        return chain([self._consumers, self._producers])
+        return chain([self._consumers, self._factories, self._traders])
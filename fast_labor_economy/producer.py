@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import NamedTuple, Optional, Tuple
 import logging
 import numpy as np
 
@@ -37,31 +37,436 @@ class Producer(Participant):
         production.add_at_ix(self.labor_index, -workforce)
         return production
 
-class Producers(Participant):
+class ActiveProducers(NamedTuple):
+    """
+    The rows of the producers that made a profit at the last evaluation,
+    copied into compact arrays.
+    """
+    active: np.ndarray
+    rows: np.ndarray
+    production_matrix: np.ndarray
+    abs_production_matrix: np.ndarray
+    labor_indices: np.ndarray
+
+class Producers(DifferentiableParticipant):
     """
     Implements a Participant for a setting where all the producers in all
     the provinces are treated as one big matrix/vector. This is hopefully
     more efficient than having a seperate participant for every work task.
+
+    Producers without profit do not produce anything, and many of them stay
+    unprofitable for most of a solve. So for a single price vector only the
+    income rates are computed for all rows and the rest for a compacted
+    matrix of the profitable rows, which is only rebuilt when the set of
+    profitable rows changes.
     """
 
     def __init__(self, production_matrix: np.ndarray,
                        labor_indices: np.ndarray):
         self._production_matrix = production_matrix
         self._labor_indices = labor_indices
+        self._compacted : Optional[ActiveProducers] = None
+
+    def _active_producers(self, active: np.ndarray) -> ActiveProducers:
+        # several markets may evaluate the producers at the same time, so
+        # the compacted rows are replaced as a whole and used from a local
+        compacted = self._compacted
+        if compacted is None or not np.array_equal(compacted.active, active):
+            rows = np.flatnonzero(active)
+            matrix = self._production_matrix[rows]
+            compacted = ActiveProducers(active, rows, matrix, np.abs(matrix),
+                                        self._labor_indices[rows])
+            self._compacted = compacted
+        return compacted
 
     def participate(self, prices: Prices) -> VolumeBundle:
+        if prices.ndim > 1:
+            return self._participate_all(prices)
         income_rate = self._production_matrix @ prices
+        compacted = self._active_producers(income_rate > 0)
+        wage_per_worker = prices[compacted.labor_indices]
+
+        sqrt_workforce = income_rate[compacted.rows] / wage_per_worker
+        goods_supply = sqrt_workforce @ compacted.production_matrix
+        goods_supply_abs = sqrt_workforce @ compacted.abs_production_matrix
+        workforce = sqrt_workforce**2
+        labor_supply = scatter_add(compacted.labor_indices, workforce,
+                                   prices.shape[-1])
+        supply = goods_supply - labor_supply
+        supply_abs = goods_supply_abs + labor_supply
+        return VolumeBundle(supply, supply_abs)
+
+    def _participate_all(self, prices: Prices) -> VolumeBundle:
+        # prices is a (markets x global width) batch of price vectors, whose
+        # profitable rows differ
+        income_rate = prices @ self._production_matrix.T
         # set entries with negative income to 0
         income_rate[income_rate < 0] = 0
-        wage_per_worker = prices[self._labor_indices]
+        wage_per_worker = prices[..., self._labor_indices]
 
         sqrt_workforce = income_rate / wage_per_worker
-        goods_supply = self._production_matrix.T @ sqrt_workforce
-        goods_supply_abs = np.abs(self._production_matrix).T @ sqrt_workforce
+        goods_supply = sqrt_workforce @ self._production_matrix
+        goods_supply_abs = sqrt_workforce @ np.abs(self._production_matrix)
         workforce = sqrt_workforce**2
-        labor_supply = np.bincount(self._labor_indices,
-                                   weights=workforce,
-                                   minlength=prices.shape[0])
+        labor_supply = scatter_add(self._labor_indices, workforce,
+                                   prices.shape[-1])
         supply = goods_supply - labor_supply
         supply_abs = goods_supply_abs + labor_supply
         return VolumeBundle(supply, supply_abs)
+
+    def jacobian(self, prices: Prices) -> np.ndarray:
+        # A producer with coefficients m and labor listing l supplies m * s
+        # goods and uses s**2 labor, where s = (m @ prices) / prices[l].
+        income_rate = self._production_matrix @ prices
+        active = income_rate > 0
+        wage_per_worker = prices[self._labor_indices]
+        sqrt_workforce = np.where(active, income_rate, 0) / wage_per_worker
+        rows = np.arange(self._labor_indices.shape[0])
+
+        # derivative of the error by s
+        d_error = np.where(active[:, np.newaxis], self._production_matrix, 0.0)
+        d_error[rows, self._labor_indices] -= 2 * sqrt_workforce
+        # derivative of s by the prices
+        d_sqrt_workforce = np.array(self._production_matrix, dtype=float)
+        d_sqrt_workforce[rows, self._labor_indices] -= sqrt_workforce
+        d_sqrt_workforce /= wage_per_worker[:, np.newaxis]
+        return d_error.T @ d_sqrt_workforce
+
+class Factories(DifferentiableParticipant):
+    """
+    Implements the factories of all the provinces as one participant. A
+    factory only uses the goods of its own province. So we group the factories
+    by province into a (provinces x factories x local goods) tensor, where
+    provinces with fewer factories are padded with rows of zeros, and evaluate
+    all provinces at once.
+    """
+
+    def __init__(self, coefficients: np.ndarray, goods_indices: np.ndarray,
+                       labor_indices: np.ndarray,
+                       abs_coefficients: Optional[np.ndarray] = None):
+        (num_provinces, _, local_width) = coefficients.shape
+        assert goods_indices.shape == (num_provinces, local_width)
+        assert labor_indices.shape == (num_provinces,)
+        # the absolute values can be passed in, so that factories loaded
+        # from memory mapped arrays do not copy the largest one of them
+        if abs_coefficients is None:
+            abs_coefficients = np.abs(coefficients)
+        assert abs_coefficients.shape == coefficients.shape
+        self._coefficients = coefficients
+        self._abs_coefficients = abs_coefficients
+        self._goods_indices = goods_indices
+        self._labor_indices = labor_indices
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """The arguments of the constructor, used to store the factories."""
+        return {"coefficients": self._coefficients,
+                "goods_indices": self._goods_indices,
+                "labor_indices": self._labor_indices,
+                "abs_coefficients": self._abs_coefficients}
+
+    def scale_province(self, province: int, factor: float) -> None:
+        """Multiplies the coefficients of all factories of a province."""
+        # a factor of 0 would turn the factories into free slots
+        assert factor > 0
+        self._coefficients = writable(self._coefficients)
+        self._abs_coefficients = writable(self._abs_coefficients)
+        self._coefficients[province] *= factor
+        self._abs_coefficients[province] *= factor
+
+    def add_factory(self, province: int, coefficients: np.ndarray) -> int:
+        """
+        Puts a factory into a free slot of the province and returns the slot.
+        Slots with coefficients of 0 are free. If the province has no free
+        slot, all provinces get twice as many slots.
+        """
+        assert np.any(coefficients), "a factory without coefficients is a free slot"
+        free = np.flatnonzero(~self._coefficients[province].any(axis=1))
+        if free.size == 0:
+            (num_provinces, num_slots, local_width) = self._coefficients.shape
+            padding = np.zeros((num_provinces, max(num_slots, 1), local_width))
+            self._coefficients = np.concatenate([self._coefficients, padding], axis=1)
+            self._abs_coefficients = np.concatenate([self._abs_coefficients, padding],
+                                                    axis=1)
+            free = np.array([num_slots])
+        slot = int(free[0])
+        self.set_factory(province, slot, coefficients)
+        return slot
+
+    def set_factory(self, province: int, slot: int, coefficients: np.ndarray) -> None:
+        self._coefficients = writable(self._coefficients)
+        self._abs_coefficients = writable(self._abs_coefficients)
+        self._coefficients[province, slot] = coefficients
+        self._abs_coefficients[province, slot] = np.abs(coefficients)
+
+    def remove_factory(self, province: int, slot: int) -> None:
+        assert self._coefficients[province, slot].any(), \
+            f"slot {slot} of province {province} holds no factory"
+        self.set_factory(province, slot, 0)
+
+    def participate(self, prices: Prices) -> VolumeBundle:
+        # prices may also be a (markets x global width) batch of price vectors
+        width = prices.shape[-1]
+        local_prices = prices[..., self._goods_indices]
+        income_rate = np.einsum('pfg,...pg->...pf', self._coefficients,
+                                local_prices)
+        # set entries with negative income to 0
+        income_rate[income_rate < 0] = 0
+        wage_per_worker = prices[..., self._labor_indices]
+
+        sqrt_workforce = income_rate / wage_per_worker[..., np.newaxis]
+        goods_supply = np.einsum('pfg,...pf->...pg', self._coefficients,
+                                 sqrt_workforce)
+        goods_supply_abs = np.einsum('pfg,...pf->...pg', self._abs_coefficients,
+                                     sqrt_workforce)
+        workforce = np.sum(sqrt_workforce**2, axis=-1)
+        labor_supply = scatter_add(self._labor_indices, workforce, width)
+        supply = scatter_add(self._goods_indices, goods_supply, width) - labor_supply
+        supply_abs = (scatter_add(self._goods_indices, goods_supply_abs, width)
+                      + labor_supply)
+        return VolumeBundle(supply, supply_abs)
+
+    def jacobian(self, prices: Prices) -> np.ndarray:
+        # Same derivatives as in Producers.jacobian, but every province
+        # contributes a block over its goods followed by its labor listing.
+        (num_provinces, num_factories, local_width) = self._coefficients.shape
+        local_prices = prices[self._goods_indices]
+        income_rate = np.einsum('pfg,pg->pf', self._coefficients, local_prices)
+        active = income_rate > 0
+        wage_per_worker = prices[self._labor_indices]
+        sqrt_workforce = (np.where(active, income_rate, 0)
+                          / wage_per_worker[:, np.newaxis])
+
+        extended = np.zeros((num_provinces, num_factories, local_width + 1))
+        extended[..., :local_width] = self._coefficients
+        d_error = np.where(active[..., np.newaxis], extended, 0.0)
+        d_error[..., local_width] -= 2 * sqrt_workforce
+        d_sqrt_workforce = extended
+        d_sqrt_workforce[..., local_width] -= sqrt_workforce
+        d_sqrt_workforce /= wage_per_worker[:, np.newaxis, np.newaxis]
+
+        blocks = np.einsum('pfi,pfj->pij', d_error, d_sqrt_workforce)
+        indices = np.concatenate([self._goods_indices,
+                                  self._labor_indices[:, np.newaxis]], axis=1)
+        return scatter_jacobian(indices, blocks, prices.shape[0])
+
+class ActiveRoutes(NamedTuple):
+    """
+    The routes that made a profit at the last evaluation, copied into
+    compact arrays.
+    """
+    active: np.ndarray
+    routes: np.ndarray
+    from_indices: np.ndarray
+    to_indices: np.ndarray
+    efficiencies: np.ndarray
+    labor_indices: np.ndarray
+
+class Traders(DifferentiableParticipant):
+    """
+    Implements the merchants of all the provinces as one participant. A
+    merchant buys a good at one listing and sells it at another, so instead of
+    a row of the production matrix with two nonzero entries we only store the
+    two listings, the trade efficiency and the listing of the labor used.
+
+    Most routes do not make a profit for most of a solve. Like Producers, a
+    single price vector only checks the margins of all routes and evaluates
+    the rest on compacted arrays of the profitable routes.
+    """
+
+    def __init__(self, from_indices: np.ndarray, to_indices: np.ndarray,
+                       efficiencies: np.ndarray, labor_indices: np.ndarray):
+        assert from_indices.shape == to_indices.shape == efficiencies.shape
+        assert labor_indices.shape == efficiencies.shape
+        assert (efficiencies >= 0).all()
+        self._from_indices = from_indices
+        self._to_indices = to_indices
+        self._efficiencies = efficiencies
+        self._labor_indices = labor_indices
+        # Routes that were removed keep their slot with an efficiency of 0
+        # until a new route takes it. Added routes are stored in the spare
+        # capacity of _storage, the attributes above are views of its first
+        # num_routes entries.
+        self._free_routes : list[int] = []
+        self._storage : dict[str, np.ndarray] = {}
+        self._compacted : Optional[ActiveRoutes] = None
+        # the routes of every listing of a column, only built for the
+        # columns that edits look routes up by, then kept up to date
+        self._indexes : dict[str, dict[int, set[int]]] = {}
+
+    def num_routes(self) -> int:
+        return self._efficiencies.shape[0]
+
+    def _columns(self) -> dict[str, np.ndarray]:
+        return {"from_indices": self._from_indices,
+                "to_indices": self._to_indices,
+                "efficiencies": self._efficiencies,
+                "labor_indices": self._labor_indices}
+
+    def _set_columns(self, columns: dict[str, np.ndarray]) -> None:
+        self._compacted = None
+        self._from_indices = columns["from_indices"]
+        self._to_indices = columns["to_indices"]
+        self._efficiencies = columns["efficiencies"]
+        self._labor_indices = columns["labor_indices"]
+
+    def _make_writable(self) -> None:
+        if not self._storage:
+            self._storage = {name: np.array(column)
+                             for (name, column) in self._columns().items()}
+            self._set_columns(self._storage)
+
+    def _append_slot(self) -> int:
+        self._make_writable()
+        route = self.num_routes()
+        capacity = self._storage["efficiencies"].shape[0]
+        if route == capacity:
+            self._storage = {name: np.concatenate([column,
+                                                   np.zeros(max(capacity, 1),
+                                                            dtype=column.dtype)])
+                             for (name, column) in self._storage.items()}
+        self._set_columns({name: column[:route + 1]
+                           for (name, column) in self._storage.items()})
+        return route
+
+    def add_route(self, from_index: int, to_index: int, efficiency: float,
+                  labor_index: int) -> int:
+        """Adds a route and returns its number."""
+        # routes with an efficiency of 0 count as removed
+        assert efficiency > 0
+        self._make_writable()
+        if self._free_routes:
+            route = self._free_routes.pop()
+        else:
+            route = self._append_slot()
+        self._from_indices[route] = from_index
+        self._to_indices[route] = to_index
+        self._efficiencies[route] = efficiency
+        self._labor_indices[route] = labor_index
+        self._compacted = None
+        for (name, index) in self._indexes.items():
+            index.setdefault(int(self._columns()[name][route]), set()).add(route)
+        return route
+
+    def remove_route(self, route: int) -> None:
+        assert route not in self._free_routes, f"route {route} was already removed"
+        assert self._efficiencies[route] != 0
+        self._make_writable()
+        self._efficiencies[route] = 0
+        self._free_routes.append(route)
+        self._compacted = None
+        for (name, index) in self._indexes.items():
+            index[int(self._columns()[name][route])].discard(route)
+
+    def scale_routes(self, routes: np.ndarray, factor: float) -> None:
+        """
+        Multiplies the efficiencies of the given routes by factor, which has
+        to be positive because routes with an efficiency of 0 count as removed.
+        """
+        assert factor > 0
+        self._make_writable()
+        self._efficiencies[routes] *= factor
+        self._compacted = None
+
+    def _index(self, name: str) -> dict[int, set[int]]:
+        index = self._indexes.get(name)
+        if index is None:
+            # one pass over all routes, later edits only update the index
+            column = self._columns()[name]
+            routes = np.flatnonzero(self._efficiencies != 0)
+            routes = routes[np.argsort(column[routes], kind='stable')]
+            (listings, starts) = np.unique(column[routes], return_index=True)
+            index = {int(listing): set(group.tolist()) for (listing, group)
+                     in zip(listings, np.split(routes, starts[1:]))}
+            self._indexes[name] = index
+        return index
+
+    def _routes_of(self, name: str, listing: int) -> np.ndarray:
+        return np.fromiter(self._index(name).get(listing, ()), int)
+
+    def routes_of_labor(self, labor_index: int) -> np.ndarray:
+        """The routes whose merchants work at the labor listing."""
+        return self._routes_of("labor_indices", labor_index)
+
+    def routes_from(self, from_index: int) -> np.ndarray:
+        """The routes that buy at the listing."""
+        return self._routes_of("from_indices", from_index)
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """The arguments of the constructor, used to store the traders."""
+        return {"from_indices": self._from_indices,
+                "to_indices": self._to_indices,
+                "efficiencies": self._efficiencies,
+                "labor_indices": self._labor_indices}
+
+    def _active_routes(self, active: np.ndarray) -> ActiveRoutes:
+        # replaced as a whole for the same reason as in Producers
+        compacted = self._compacted
+        if compacted is None or not np.array_equal(compacted.active, active):
+            routes = np.flatnonzero(active)
+            compacted = ActiveRoutes(active, routes, self._from_indices[routes],
+                                     self._to_indices[routes],
+                                     self._efficiencies[routes],
+                                     self._labor_indices[routes])
+            self._compacted = compacted
+        return compacted
+
+    def participate(self, prices: Prices) -> VolumeBundle:
+        if prices.ndim > 1:
+            return self._participate_all(prices)
+        width = prices.shape[-1]
+        income_rate = self._efficiencies * (prices[self._to_indices]
+                                            - prices[self._from_indices])
+        compacted = self._active_routes(income_rate > 0)
+        wage_per_worker = prices[compacted.labor_indices]
+
+        sqrt_workforce = income_rate[compacted.routes] / wage_per_worker
+        moved = compacted.efficiencies * sqrt_workforce
+        bought = scatter_add(compacted.from_indices, moved, width)
+        sold = scatter_add(compacted.to_indices, moved, width)
+        workforce = sqrt_workforce**2
+        labor_supply = scatter_add(compacted.labor_indices, workforce, width)
+        supply = sold - bought - labor_supply
+        supply_abs = sold + bought + labor_supply
+        return VolumeBundle(supply, supply_abs)
+
+    def _participate_all(self, prices: Prices) -> VolumeBundle:
+        # prices is a (markets x global width) batch of price vectors, whose
+        # profitable routes differ
+        width = prices.shape[-1]
+        margin = prices[..., self._to_indices] - prices[..., self._from_indices]
+        income_rate = self._efficiencies * margin
+        # set entries with negative income to 0
+        income_rate[income_rate < 0] = 0
+        wage_per_worker = prices[..., self._labor_indices]
+
+        sqrt_workforce = income_rate / wage_per_worker
+        moved = self._efficiencies * sqrt_workforce
+        bought = scatter_add(self._from_indices, moved, width)
+        sold = scatter_add(self._to_indices, moved, width)
+        workforce = sqrt_workforce**2
+        labor_supply = scatter_add(self._labor_indices, workforce, width)
+        supply = sold - bought - labor_supply
+        supply_abs = sold + bought + labor_supply
+        return VolumeBundle(supply, supply_abs)
+
+    def jacobian(self, prices: Prices) -> np.ndarray:
+        # Same derivatives as in Producers.jacobian, but every route only
+        # contributes a block over its two listings and its labor listing.
+        margin = prices[self._to_indices] - prices[self._from_indices]
+        income_rate = self._efficiencies * margin
+        active = income_rate > 0
+        wage_per_worker = prices[self._labor_indices]
+        sqrt_workforce = np.where(active, income_rate, 0) / wage_per_worker
+
+        coefficients = np.stack([-self._efficiencies, self._efficiencies,
+                                 np.zeros(self.num_routes())], axis=1)
+        d_error = np.where(active[:, np.newaxis], coefficients, 0.0)
+        d_error[:, 2] -= 2 * sqrt_workforce
+        d_sqrt_workforce = coefficients
+        d_sqrt_workforce[:, 2] -= sqrt_workforce
+        d_sqrt_workforce /= wage_per_worker[:, np.newaxis]
+
+        blocks = d_error[:, :, np.newaxis] * d_sqrt_workforce[:, np.newaxis, :]
+        indices = np.stack([self._from_indices, self._to_indices,
+                            self._labor_indices], axis=1)
+        return scatter_jacobian(indices, blocks, prices.shape[0])
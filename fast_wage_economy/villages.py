@@ -0,0 +1,69 @@
+import numpy as np
+
+from core.bundle import *
+from core.participant import *
+from consumer import consume_blocks
+
+class Villages(Participant):
+    """
+    Implements the villages of all the provinces as one participant. The
+    tasks of all the balanced producers are stacked into one list of rows.
+    Every row stores the listings it touches and its coefficients, padded with
+    zeros to a common width, together with the province it belongs to. The
+    normalization of the allocation within a province is a segment sum over
+    the rows of that province.
+    """
+
+    def __init__(self, populations: np.ndarray, utilities: np.ndarray,
+                       goods_indices: np.ndarray, task_provinces: np.ndarray,
+                       task_indices: np.ndarray, task_coefficients: np.ndarray):
+        assert utilities.shape == goods_indices.shape
+        assert populations.shape == utilities.shape[:1]
+        assert task_indices.shape == task_coefficients.shape
+        assert task_provinces.shape == task_indices.shape[:1]
+        self._populations = populations
+        self._utilities = utilities
+        self._goods_indices = goods_indices
+        self._task_provinces = task_provinces
+        self._task_indices = task_indices
+        self._task_coefficients = task_coefficients
+        self._abs_task_coefficients = np.abs(task_coefficients)
+
+    def num_provinces(self) -> int:
+        return self._populations.shape[0]
+
+    def num_tasks(self) -> int:
+        return self._task_provinces.shape[0]
+
+    def population(self, province: int) -> int:
+        return self._populations[province]
+
+    def participate(self, prices: Prices) -> VolumeBundle:
+        # prices may also be a (markets x global width) batch of price vectors
+        width = prices.shape[-1]
+        num_provinces = self.num_provinces()
+        # compute for each task how much money it makes, money loosing tasks
+        # are canceled
+        payoff_one_unit = np.sum(self._task_coefficients
+                                 * prices[..., self._task_indices], axis=-1)
+        payoff_one_unit[payoff_one_unit < 0] = 0
+        lambda_squared = scatter_add(self._task_provinces, payoff_one_unit**2,
+                                     num_provinces)
+        # the allocation of a task is payoff**2 / lambda_squared, but we only
+        # need its root
+        sqrt_lambda = np.sqrt(lambda_squared)
+        sqrt_allocation = payoff_one_unit / sqrt_lambda[..., self._task_provinces]
+        workforce = self._populations[self._task_provinces] * sqrt_allocation
+
+        moved = self._task_coefficients * workforce[..., np.newaxis]
+        moved_abs = self._abs_task_coefficients * workforce[..., np.newaxis]
+        supply = scatter_add(self._task_indices, moved, width)
+        supply_abs = scatter_add(self._task_indices, moved_abs, width)
+
+        # the wages per worker of a province are prices @ supply per worker,
+        # which simplifies to sqrt(lambda_squared)
+        wages = self._populations * sqrt_lambda
+        local_prices = prices[..., self._goods_indices]
+        consumption = consume_blocks(self._utilities, wages, local_prices)
+        demand = scatter_add(self._goods_indices, consumption, width)
+        return VolumeBundle(supply - demand, supply_abs + demand)
@@ -0,0 +1,87 @@
+from typing import Iterable, Callable
+from itertools import chain
+import numpy as np
+
+from fast_wage_economy.villages import Villages
+from core.participant import Participant
+from core.schema import MarketPriceSchema, ProvinceId
+import core.economy as economy
+
+def uncurry(function: Callable):
+    return lambda args: function(*args)
+
+class WageEconomy(economy.Economy):
+    """
+    Implements the same economy as wage_economy.WageEconomy, but all the
+    villages are evaluated by one Villages participant.
+    """
+
+    def __init__(self, market_schema: MarketPriceSchema, villages: Villages):
+        self._market_schema = market_schema
+        self._villages = villages
+
+    @classmethod
+    def from_config(cls, config: economy.EconomyConfig):
+        market_schema = MarketPriceSchema(config.goods_schema,
+                                          config.province_schema)
+        num_provinces = len(config.province_configs)
+
+        populations = np.fromiter((pc.population for pc in config.province_configs),
+                                  int, num_provinces)
+        utilities = np.array([pc.utilities for pc in config.province_configs],
+                             dtype=float)
+        production_width = market_schema.local_schema().production_width()
+        goods_offsets = np.arange(production_width)
+        goods_indices = np.array([market_schema.start_of_province(province)
+                                  + goods_offsets
+                                  for province in range(num_provinces)],
+                                 dtype=int).reshape((num_provinces, production_width))
+
+        # every task is a row over at most task_width listings. Factories use
+        # the goods of their province, merchants two listings. Unused entries
+        # have a coefficient of 0.
+        task_width = max(production_width, 2)
+        def tasks_for_province(province: ProvinceId,
+                               province_config: economy.ProvinceConfig
+                              ) -> Iterable[tuple[int, np.ndarray, np.ndarray]]:
+            def create_factory(factory_config: economy.FactoryConfig):
+                indices = np.zeros(task_width, dtype=int)
+                coefficients = np.zeros(task_width)
+                indices[:production_width] = goods_indices[province]
+                coefficients[:production_width] = factory_config.production_coefficients
+                return (province, indices, coefficients)
+
+            def create_merchant(trade_config: economy.TradeConfig):
+                indices = np.zeros(task_width, dtype=int)
+                coefficients = np.zeros(task_width)
+                indices[0] = market_schema.good_in_province(trade_config.good,
+                                                            trade_config.from_province)
+                indices[1] = market_schema.good_in_province(trade_config.good,
+                                                            trade_config.to_province)
+                coefficients[0] = -trade_config.trade_factor
+                coefficients[1] = trade_config.trade_factor
+                return (province, indices, coefficients)
+
+            return chain(map(create_factory, province_config.factories),
+                         map(create_merchant, province_config.merchants))
+
+        tasks = list(chain(*map(uncurry(tasks_for_province),
+                                enumerate(config.province_configs))))
+        task_provinces = np.fromiter((t[0] for t in tasks), int, len(tasks))
+        task_indices = np.array([t[1] for t in tasks],
+                                dtype=int).reshape((len(tasks), task_width))
+        task_coefficients = np.array([t[2] for t in tasks],
+                                     dtype=float).reshape((len(tasks), task_width))
+
+        villages = Villages(populations, utilities, goods_indices,
+                            task_provinces, task_indices, task_coefficients)
+        return cls(market_schema, villages)
+
+    def population_in_province(self, province: ProvinceId) -> int:
+        return self._villages.population(province)
+
+    def market_schema(self) -> MarketPriceSchema:
+        return self._market_schema
+
+    def participants(self) -> Iterable[Participant]:
+        return [self._villages]
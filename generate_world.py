@@ -0,0 +1,104 @@
+"""
+Generates random worlds in the json format of world.json. The worlds are
+reproducible from their parameters, so they can be used to measure how the
+economies and markets scale. Run it from the root of the repository with
+
+    python generate_world.py [provinces] [seed] > big.json
+"""
+
+import json
+import sys
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+import core.economy as economy
+from read_world import read_world
+
+@dataclass(frozen=True)
+class WorldParameters:
+    num_provinces: int = 8
+    num_tradable_goods: int = 7
+    num_fixed_goods: int = 1
+    factories_per_province: int = 3
+    # probability that two provinces are trade partners
+    trade_density: float = 0.5
+    seed: int = 0
+
+def generate_world(parameters: WorldParameters) -> dict[str, Any]:
+    """
+    Every province has a farm that produces some goods out of nothing and
+    workshops that turn one or two goods into another one. Every good is
+    produced by the farm of at least one province and valued by all
+    consumers.
+    """
+    # the farms need a tradable good each to cover all of them
+    if parameters.num_tradable_goods < 1:
+        raise ValueError("a generated world needs at least one tradable good")
+    if parameters.factories_per_province < 1:
+        raise ValueError("every province of a generated world needs its farm")
+    rng = np.random.default_rng(parameters.seed)
+    tradable_goods = [f"good{g}" for g in range(parameters.num_tradable_goods)]
+    fixed_goods = [f"fixed{g}" for g in range(parameters.num_fixed_goods)]
+    goods = tradable_goods + fixed_goods
+    names = [f"province{p}" for p in range(parameters.num_provinces)]
+
+    def coefficient(low: float, high: float) -> float:
+        return round(float(rng.uniform(low, high)), 2)
+
+    def farm(province: int) -> dict[str, float]:
+        produced = [g for g in goods if rng.random() < 0.4]
+        # the farms together produce every tradable good, and every province
+        # produces its fixed goods
+        produced.append(tradable_goods[province % len(tradable_goods)])
+        produced.extend(fixed_goods)
+        return {g: coefficient(0.5, 5) for g in produced}
+
+    def workshop() -> dict[str, float]:
+        (output, *inputs) = rng.choice(goods, size=min(len(goods), 3),
+                                       replace=False)
+        recipe = {str(g): -coefficient(0.2, 2) for g in inputs[:rng.integers(1, 3)]}
+        recipe[str(output)] = coefficient(1, 3)
+        return recipe
+
+    def utilities() -> dict[str, float]:
+        # goods that nobody values would become worthless, and eva can not
+        # push their price below MIN_PRICE
+        return {g: coefficient(0.2, 3) for g in goods}
+
+    partners : list[list[str]] = [[] for _ in names]
+    for home in range(parameters.num_provinces):
+        for foreign in range(home + 1, parameters.num_provinces):
+            if rng.random() < parameters.trade_density:
+                partners[home].append(names[foreign])
+                partners[foreign].append(names[home])
+
+    provinces = [{
+        "name": names[p],
+        "population": int(rng.integers(100, 10000)),
+        "utilities": utilities(),
+        "producers": ([farm(p)] + [workshop() for _ in
+                                   range(parameters.factories_per_province - 1)]),
+        "trade_partners": partners[p],
+    } for p in range(parameters.num_provinces)]
+
+    return {
+        "provinces": provinces,
+        "tradable_goods": tradable_goods,
+        "fixed_goods": fixed_goods,
+        "trade_factors": {g: coefficient(1, 3) for g in tradable_goods},
+    }
+
+def generate_config(parameters: WorldParameters) -> economy.EconomyConfig:
+    return read_world(generate_world(parameters))
+
+def main() -> int:
+    num_provinces = int(sys.argv[1]) if len(sys.argv) >= 2 else 8
+    seed = int(sys.argv[2]) if len(sys.argv) >= 3 else 0
+    parameters = WorldParameters(num_provinces=num_provinces, seed=seed)
+    json.dump(generate_world(parameters), sys.stdout, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
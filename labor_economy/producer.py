@@ -43,6 +43,9 @@ class Producer(Participant):
         self.production_coefficients = production_coefficients
         self.labor_index = labor_index
         # could this also be implemented if we make labor part of the production_coefficients
+        # the listings that the producer actually trades in
+        self.support = np.flatnonzero(production_coefficients)
+        self.support_coefficients = production_coefficients[self.support]
 
     def participate(self, prices : Prices) -> VolumeBundle:
         (workforce,production) = produce(self.name,
@@ -51,3 +54,14 @@ class Producer(Participant):
                                          prices)
         production.add_at_ix(self.labor_index, -workforce)
         return production
+
+    def participate_into(self, prices : Prices, out : VolumeBundle) -> None:
+        # same as participate, but only touches the support
+        income_rate = self.support_coefficients @ prices[self.support]
+        if (income_rate <= 0):
+            return
+        sqrt_workforce = income_rate / prices[self.labor_index]
+        supply = self.support_coefficients * sqrt_workforce
+        out.error[self.support] += supply
+        out.double_volume[self.support] += np.absolute(supply)
+        out.add_at_ix(self.labor_index, -sqrt_workforce**2)
@@ -3,10 +3,11 @@ This is the main file to execute whatever code I am currently intersted
 in. It is not actually any proper application.
 """
 
+import dataclasses
+import functools
 import json
 import logging
 import sys
-from typing import Callable
 
 import numpy as np
 
@@ -15,8 +16,12 @@ import labor_economy.labor_economy as le
 import fast_labor_economy.labor_economy as ne
 import market.base as mb
 import market.eva as eva
+import market.sweep as sweep
+import market.tuning as tuning
 import pretty_table as pt
+from equilibrium_store import EquilibriumStore
 from read_world import read_world
+from world_cache import cached_economy, cached_participants, cached_tuning
 
 #np.set_printoptions(precision=3,suppress=True,threshold=12)
 
@@ -26,15 +31,12 @@ from read_world import read_world
 logging.basicConfig(level=logging.ERROR, format='%(message)s (%(levelname)s)')
 
 
-def simple_run(market_schema, p0, participants, epsilon):
+def simple_run(market_schema, p0, participants, tuned):
     scaling = mb.ScalingConfiguration(
         set_to_price=10,
         norm_listing=market_schema.listing_of_good_in_province("food", "Switzerland"))
 
-    config = eva.EvaConfiguration(
-             epsilon=epsilon,
-             rate = 0.08,
-             first_momentum_mixin = 0.09,
+    config = dataclasses.replace(tuned,
              keep_history = False,
              max_iterations = 1000
     )
@@ -44,37 +46,45 @@ def simple_run(market_schema, p0, participants, epsilon):
     pt.pretty_table([("price", p)])
     #print(r.history)
     print(f"eva iterations: {r.iterations}")
-    
-def grid_search(func: Callable[[float, float], int],
-                x_values: np.ndarray,
-                y_values: np.ndarray) -> np.ndarray:
-    # Initialize the result array
-    results = np.empty((len(x_values), len(y_values)), dtype=int)
-
-    # Use nested loops to compute the function over the grid
-    for i, x in enumerate(x_values):
-        for j, y in enumerate(y_values):
-            results[i, j] = func(x, y)
-
-    return results
+    return r
 
 def grid_run(market_schema, p0, participants, epsilon):
-    def evaluator(x: float, y: float) -> int:
-        config = eva.EvaConfiguration(
-             epsilon=epsilon,
-             rate=x,
-             first_momentum_mixin = y,
-             max_iterations = 2000
-        )
-        print(f"starting eva with rate={x}, first_momentum_mixin={y}")
-        r = eva.make_market(participants, p0, config)
-        num_iters = r.iterations
-        print(f"eva iterations: {num_iters}")
-        return num_iters
+    x_points = np.arange(0.06, 0.13, 0.005)
+    y_points = np.arange(0.06, 0.12, 0.005)
+    # all cells of the grid are solved at once as a batch of markets
+    configs = [eva.EvaConfiguration(
+                   epsilon=epsilon,
+                   rate=x,
+                   first_momentum_mixin = y,
+                   max_iterations = 2000
+               ) for x in x_points for y in y_points]
+    print(f"starting eva on {len(configs)} grid cells")
+    prices = np.tile(p0, (len(configs), 1))
+    results = eva.make_markets(participants, prices, configs)
+    num_iters = np.fromiter((r.iterations for r in results), int, len(results))
+    result = num_iters.reshape(len(x_points), len(y_points))
+    print(result)
 
+def sweep_run(filename, p0, epsilon):
     x_points = np.arange(0.06, 0.13, 0.005)
     y_points = np.arange(0.06, 0.12, 0.005)
-    result = grid_search(evaluator, x_points, y_points)
+    configs = [eva.EvaConfiguration(
+                   epsilon=epsilon,
+                   rate=x,
+                   first_momentum_mixin = y,
+                   max_iterations = 2000
+               ) for x in x_points for y in y_points]
+    print(f"starting a sweep over {len(configs)} grid cells")
+    # cells that are cancelled because they are slower than the best cell
+    # stay at -1
+    num_iters = np.full(len(configs), -1)
+    load = functools.partial(cached_participants, filename)
+    for (index, r) in sweep.sweep(load, p0, configs):
+        if not r.run.cancelled:
+            num_iters[index] = r.iterations
+            print(f"rate {configs[index].rate:.3f} mixin "
+                  f"{configs[index].first_momentum_mixin:.3f}: {r.iterations}")
+    result = num_iters.reshape(len(x_points), len(y_points))
     print(result)
 
 def main():
@@ -83,13 +93,12 @@ def main():
     else:
         filename = "world.json"
 
-    with open(filename, "r", encoding='utf8') as input_stream:
-        parsed_json = json.load(input_stream)
-
-    economy_config = read_world(parsed_json)
+    #with open(filename, "r", encoding='utf8') as input_stream:
+    #    economy_config = read_world(json.load(input_stream))
     #economy = we.WageEconomy.from_config(economy_config)
     #economy = le.LaborEconomy.from_config(economy_config)
-    economy = ne.LaborEconomy.from_config(economy_config)
+    # the fast labor economy is compiled once and then loaded from the cache
+    economy = cached_economy(filename)
 
     market_schema = economy.market_schema()
     pt.set_global_table_logging_from_schema(market_schema)
@@ -98,8 +107,17 @@ def main():
     epsilon = 0.01
     participants = list(economy.participants())
 
-    simple_run(market_schema, p0, participants, epsilon)
+    # the rate and first momentum mixin are tuned once per world
+    tuned = cached_tuning(filename, participants, p0,
+                          tuning.TuningConfiguration(epsilon=epsilon))
+    # start from the prices of the last solve of this or a similar economy
+    store = EquilibriumStore()
+    r = simple_run(market_schema, store.initial_price(economy), participants,
+                   tuned)
+    if not r.timeout:
+        store.save(economy, r.price)
     #grid_run(market_schema, p0, participants, epsilon)
+    #sweep_run(filename, p0, epsilon)
 
     return 0
 
@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+
+from typing import Optional
+
+from market.base import *
+import market.eva as eva
+from market.history import HistoryConfiguration, make_history
+import pretty_table as tl
+
+@dataclass(frozen=True)
+class AdamConfiguration:
+    epsilon: float = 0.1
+    # typical change of a log price in one step, single steps can be larger
+    rate: float = 0.01
+    first_momentum_mixin: float = 0.05
+    second_momentum_mixin: float = 0.001
+    max_iterations: int | None = 10000
+    keep_history: bool = False
+    history: Optional[HistoryConfiguration] = None
+
+# keeps the step finite for listings that never had an error
+ADAM_EPSILON : float = 1e-12
+
+def make_market(participants : Iterable[Participant], price : Prices,
+                config : AdamConfiguration = AdamConfiguration(),
+                run : Optional[SolverRun] = None) -> eva.Result:
+    """
+    Adam applied to the log prices. Like eva it follows the momentum of the
+    relative errors, but every listing divides its momentum by the root of its
+    own second momentum. So every listing moves at a speed of about rate per
+    iteration, no matter how large its relative errors are.
+    """
+    logging.info(f"starting adam")
+    iterations = 1
+    history = make_history(price.shape[0], config.keep_history, config.history,
+                           config.max_iterations)
+    if run is None:
+        run = SolverRun()
+    run.history = history
+    supply = one_iteration(participants, price, run=run)
+    first_momentum = np.zeros(price.shape)
+    second_momentum = np.zeros(price.shape)
+    while True:
+        badness = absolute_badness(supply)
+        history.record(iterations, price, supply, badness, first_momentum)
+        if badness < config.epsilon:
+            return eva.Result(price=price,
+                              supply=supply,
+                              timeout=False,
+                              iterations=iterations,
+                              history=history,
+                              run=run)
+        if config.max_iterations is not None and iterations >= config.max_iterations:
+            return eva.Result(price=price,
+                              supply=supply,
+                              timeout=True,
+                              iterations=iterations,
+                              history=history,
+                              run=run)
+        logging.info(f"\nnext iteration because of badness: {badness}")
+
+        gradient = supply.update_term()
+        first_momentum = mixing(first_momentum, gradient,
+                                config.first_momentum_mixin)
+        second_momentum = mixing(second_momentum, gradient * gradient,
+                                 config.second_momentum_mixin)
+        # correct for the bias towards the initial momenta of 0
+        first_unbiased = (first_momentum
+                          / (1 - (1 - config.first_momentum_mixin)**iterations))
+        second_unbiased = (second_momentum
+                           / (1 - (1 - config.second_momentum_mixin)**iterations))
+        step = first_unbiased / (np.sqrt(second_unbiased) + ADAM_EPSILON)
+
+        price = price * np.exp(-config.rate * step)
+        price = np.maximum(price, MIN_PRICE)
+        run.step += 1
+        supply = one_iteration(participants, price, run=run)
+        iterations += 1
+        tl.log_values(logging.DEBUG, [("price", price),
+                                      ("sold", supply.sold()),
+                                      ("bought", supply.bought()),
+                                      ("step*1000", step*1000)
+                                    ])
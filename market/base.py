@@ -1,52 +1,89 @@
 import numpy as np
 from numpy.linalg import norm
 import logging
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 
 from typing import Callable,Iterable,Optional
 #import numpy.typing as npt
 
 from core.participant import *
+from market.history import History
 
 #Market = Callable[[Iterable[Participant],Prices],Prices]
 
 MIN_PRICE = 0.0001
 
-iteration : int = 0
+@dataclass
+class SolverRun:
+    """
+    The state of one solve. A market counts its evaluations and steps in its
+    run instead of in globals, so several markets can be solved at the same
+    time, for example in a thread pool.
+    """
+    # number of evaluations of all the participants
+    iteration: int = 0
+    # number of times the market moved its prices
+    step: int = 0
+    # time spent in evaluating the participants
+    evaluation_seconds: float = 0.0
+    started: float = field(default_factory=time.perf_counter)
+    history: Optional[History] = None
+    # eva asks this once per iteration and stops the solve if it returns True
+    cancel: Optional[Callable[[], bool]] = None
+    cancelled: bool = False
+
+    def seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+    def check_cancel(self) -> bool:
+        if self.cancel is not None and self.cancel():
+            self.cancelled = True
+        return self.cancelled
+
+# used by one_iteration if it is not given a run, only for old code that
+# resets and reads the counters below
+default_run = SolverRun()
 
 def reset_iteration() -> None:
-    global iteration
-    iteration = 0
+    default_run.iteration = 0
 
 def increment_iteration() -> None:
-    global iteration
-    iteration += 1
+    default_run.iteration += 1
 
 def get_iteration() -> int:
-    global iteration
-    return iteration
-
-
-step: int = 0
+    return default_run.iteration
 
 def reset_step() -> None:
-    global step
-    step = 0
+    default_run.step = 0
 
 def increment_step() -> None:
-    global step
-    step += 1
+    default_run.step += 1
 
 def get_step() -> int:
-    global step
-    return step
-
-def one_iteration(participants: Iterable[Participant], prices : Prices) -> VolumeBundle:
-    increment_iteration()
-    logging.debug(f"at iteration {get_iteration()}")
-    eb = VolumeBundle.zero(prices.shape)
+    return default_run.step
+
+def one_iteration(participants: Iterable[Participant], prices : Prices,
+                  out : Optional[VolumeBundle] = None,
+                  run : Optional[SolverRun] = None) -> VolumeBundle:
+    """
+    Sums up the bundles of all participants. If out is given, then the sum is
+    accumulated in it instead of in a newly allocated bundle. The evaluation
+    is counted in run, or in default_run if no run is given.
+    """
+    if run is None:
+        run = default_run
+    run.iteration += 1
+    logging.debug(f"at iteration {run.iteration}")
+    start = time.perf_counter()
+    if out is None:
+        eb = VolumeBundle.zero(prices.shape)
+    else:
+        eb = out
+        eb.clear()
     for p in participants:
-        eb += p.participate(prices)
+        p.participate_into(prices, eb)
+    run.evaluation_seconds += time.perf_counter() - start
     return eb
 
 MIN_PRICE : float = 0.001
@@ -71,12 +108,13 @@ def mixing(a: np.ndarray, b: np.ndarray, factor: float) -> np.ndarray:
     assert a.shape == b.shape
     return (1 - factor)*a + factor*b
 
+# For a batch of markets the badness functions return one value per market.
 def relative_badness(error : VolumeBundle) -> float:
     #return norm(error)
     #return norm(error, ord=1)
-    return norm(error.error/(error.double_volume + 0.0001), ord=1)
+    return norm(error.error/(error.double_volume + 0.0001), ord=1, axis=-1)
 
 def absolute_badness(error : VolumeBundle) -> float:
     #return norm(error)
     #return norm(error, ord=1)
-    return norm(error.error, ord=1)
+    return norm(error.error, ord=1, axis=-1)
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+
+from typing import Optional
+
+from market.base import *
+import market.eva as eva
+from market.history import HistoryConfiguration, make_history
+import market.line_search as ls
+import pretty_table as tl
+
+@dataclass(frozen=True)
+class ElasticMarketConfiguration:
+    epsilon: float = 0.1
+    # a step is accepted if its badness times necessary_improvement is at
+    # most the current badness, see line_search.backtrack
+    necessary_improvement: float = 0.5
+    necessary_improvement_decay: float = 0.95
+    # the initial elasticities are 1 / initial_backoff, which makes the first
+    # steps the same as the ones of eva with rate initial_backoff
+    initial_backoff: float = 0.08
+    backoff_decay: float = 0.5
+    # mixing of the measured elasticities into a fast inner estimate, and of
+    # the inner estimate into the elasticities used for the steps
+    elasticity_mixing: float = 0.05
+    inner_elasticity_mixing: float = 0.4
+    min_elasticity: float = 1
+    max_elasticity: float = 1000
+    first_momentum_mixin: float = 0.09
+    # largest relative change of a price in one step
+    max_step: float = 0.3
+    max_backtracks: int = 20
+    price_scaling: Optional[ScalingConfiguration] = None
+    max_iterations: int | None = 10000
+    keep_history: bool = False
+    history: Optional[HistoryConfiguration] = None
+
+# log prices that moved less than this do not give an elasticity estimate
+MIN_LOG_PRICE_CHANGE : float = 1e-6
+
+def make_market(participants : Iterable[Participant], price : Prices,
+                config : ElasticMarketConfiguration = ElasticMarketConfiguration(),
+                run : Optional[SolverRun] = None) -> eva.Result:
+    """
+    Estimates for every listing how strongly its relative error reacts to a
+    change of its log price, from the errors and prices of successive
+    iterations. The step of a listing is its relative error divided by this
+    elasticity, which is a Newton step with a diagonal jacobian. As in eva the
+    steps are smoothed with a momentum, and steps that increase the badness
+    too much are shortened. Like in eva, iterations counts the evaluations of
+    the participants.
+    """
+    logging.info(f"starting elastic market")
+    participants = list(participants)
+    iterations = 1
+    history = make_history(price.shape[0], config.keep_history, config.history,
+                           config.max_iterations)
+    if run is None:
+        run = SolverRun()
+    run.history = history
+    supply = one_iteration(participants, price, run=run)
+    badness = absolute_badness(supply)
+    relative_error = supply.update_term()
+    elasticity = np.full(price.shape, 1 / config.initial_backoff)
+    inner_elasticity = elasticity.copy()
+    # like eva we start with a damped momentum
+    momentum = 0.1 * relative_error / elasticity
+    while True:
+        history.record(iterations, price, supply, badness, momentum)
+        if badness < config.epsilon:
+            return eva.Result(price=price,
+                              supply=supply,
+                              timeout=False,
+                              iterations=iterations,
+                              history=history,
+                              run=run)
+        if config.max_iterations is not None and iterations >= config.max_iterations:
+            return eva.Result(price=price,
+                              supply=supply,
+                              timeout=True,
+                              iterations=iterations,
+                              history=history,
+                              run=run)
+        logging.info(f"\nnext iteration because of badness: {badness}")
+
+        direction = np.clip(momentum, -config.max_step, config.max_step)
+        (trial, _, evaluations) = ls.backtrack(participants, price, badness,
+                                               1.0, direction, config, run)
+        iterations += evaluations
+
+        trial_relative_error = trial.supply.update_term()
+        log_price_change = np.log(trial.price) - np.log(price)
+        measured = np.abs(log_price_change) > MIN_LOG_PRICE_CHANGE
+        safe_change = np.where(measured, log_price_change, 1)
+        measured_elasticity = np.clip(
+            (trial_relative_error - relative_error) / safe_change,
+            config.min_elasticity, config.max_elasticity)
+        inner_elasticity = np.where(measured,
+                                    mixing(inner_elasticity, measured_elasticity,
+                                           config.inner_elasticity_mixing),
+                                    inner_elasticity)
+        elasticity = mixing(elasticity, inner_elasticity, config.elasticity_mixing)
+
+        (price, supply, badness) = (trial.price, trial.supply, trial.badness)
+        run.step += 1
+        relative_error = trial_relative_error
+        if config.price_scaling is not None:
+            price = apply_price_scaling(price, config.price_scaling)
+        momentum = mixing(momentum, relative_error / elasticity,
+                          config.first_momentum_mixin)
+        tl.log_values(logging.DEBUG, [("price", price),
+                                      ("sold", supply.sold()),
+                                      ("bought", supply.bought()),
+                                      ("elasticity", elasticity)
+                                    ])
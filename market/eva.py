@@ -1,8 +1,9 @@
 from dataclasses import dataclass
 
-from typing import Tuple,Optional
+from typing import Tuple,Optional,Sequence
 
 from market.base import *
+from market.history import Iteration, History, HistoryConfiguration, make_history
 import pretty_table as tl
 from core.bundle import Bundle
 
@@ -14,13 +15,12 @@ class EvaConfiguration:
     first_momentum_mixin: float = 0.1
     max_iterations: int | None = 10000
     keep_history: bool = False
-
-@dataclass(frozen=True)
-class Iteration:
-    price: Prices
-    supply: Bundle
-    badness: float
-    momentum: np.ndarray
+    # how the history is recorded, setting it also keeps the history
+    history: Optional[HistoryConfiguration] = None
+    # number of past steps used for Anderson acceleration, 0 turns it off
+    anderson_window: int = 0
+    # forget the past steps when the badness grows by more than this factor
+    anderson_restart: float = 1.2
 
 @dataclass(frozen=True)
 class Result:
@@ -28,47 +28,181 @@ class Result:
     supply: Bundle
     timeout: bool
     iterations: int 
-    history: list[Iteration]
+    history: History
+    run: Optional[SolverRun] = None
+
+class AndersonAccelerator:
+    """
+    Anderson acceleration of the eva iteration. The state of eva consists of
+    the log prices and the momentum, and every eva step maps a state to a new
+    one. The accelerator keeps the last few states with the steps taken from
+    them and extrapolates to the state at which the step would vanish.
+    """
+
+    # relative Tikhonov regularization of the least squares problem
+    REGULARIZATION : float = 0.0001
+
+    def __init__(self, window : int, restart : float):
+        self._window = window
+        self._restart = restart
+        self._states : list[np.ndarray] = []
+        self._steps : list[np.ndarray] = []
+        self._badness = np.inf
+
+    def extrapolate(self, state : np.ndarray, image : np.ndarray,
+                    badness : float) -> np.ndarray:
+        # fall back to the plain step when the badness grows
+        if badness > self._restart * self._badness:
+            self._states.clear()
+            self._steps.clear()
+        self._badness = badness
+        self._states.append(state)
+        self._steps.append(image - state)
+        del self._states[:-(self._window + 1)]
+        del self._steps[:-(self._window + 1)]
+        if len(self._steps) < 2:
+            return image
+        state_changes = np.diff(np.array(self._states), axis=0).T
+        step_changes = np.diff(np.array(self._steps), axis=0).T
+        gram = step_changes.T @ step_changes
+        gram += self.REGULARIZATION * np.trace(gram) * np.eye(gram.shape[0])
+        gamma = np.linalg.solve(gram, step_changes.T @ self._steps[-1])
+        return image - (state_changes + step_changes) @ gamma
 
 def make_market(participants : Iterable[Participant], price : Prices,
-                config : EvaConfiguration = EvaConfiguration()) -> Result:
+                config : EvaConfiguration = EvaConfiguration(),
+                run : Optional[SolverRun] = None) -> Result:
     logging.info(f"starting eva")
     iterations = 1
-    history = []
-    supply = one_iteration(participants, price)
+    history = make_history(price.shape[0], config.keep_history, config.history,
+                           config.max_iterations)
+    if run is None:
+        run = SolverRun()
+    run.history = history
+    # every iteration accumulates the supply in the same buffer
+    buffer = VolumeBundle.zero(price.shape)
+    supply = one_iteration(participants, price, buffer, run)
     # Here we could multiply with the price already
     first_momentum = config.initial_backoff * supply.update_term()
+    # the state the next step starts from, with Anderson acceleration this
+    # differs from the last evaluated price and momentum
+    (base_price, base_momentum) = (price, first_momentum)
+    if config.anderson_window > 0:
+        accelerator = AndersonAccelerator(config.anderson_window,
+                                          config.anderson_restart)
     while True:
         badness = absolute_badness(supply)
-        if config.keep_history:
-            iteration = Iteration(price=price,
-                                  supply=supply,
-                                  badness=badness,
-                                  momentum=first_momentum)
-            history.append(iteration)
+        history.record(iterations, price, supply, badness, first_momentum)
         if badness < config.epsilon:
             return Result(price=price,
                           supply=supply,
                           timeout=False,
                           iterations=iterations,
-                          history=history)
-        if iterations >= config.max_iterations:
+                          history=history,
+                          run=run)
+        # a cancelled market reports a timeout
+        timeout = (config.max_iterations is not None
+                   and iterations >= config.max_iterations)
+        if timeout or run.check_cancel():
             return Result(price=price,
                           supply=supply,
                           timeout=True,
                           iterations=iterations,
-                          history=history)
+                          history=history,
+                          run=run)
         logging.info(f"\nnext iteration because of badness: {badness}")
 
-        price = price * (1 - config.rate * first_momentum)
+        price = base_price * (1 - config.rate * base_momentum)
         price = np.maximum(price, MIN_PRICE)
-        supply = one_iteration(participants, price)
-        first_momentum = mixing(first_momentum, supply.update_term(),
+        run.step += 1
+        supply = one_iteration(participants, price, buffer, run)
+        first_momentum = mixing(base_momentum, supply.update_term(),
                                 config.first_momentum_mixin)
         iterations += 1
+        if config.anderson_window > 0:
+            width = price.shape[0]
+            state = np.concatenate([np.log(base_price), base_momentum])
+            image = np.concatenate([np.log(price), first_momentum])
+            extrapolated = accelerator.extrapolate(state, image,
+                                                   absolute_badness(supply))
+            base_price = np.maximum(np.exp(extrapolated[:width]), MIN_PRICE)
+            base_momentum = extrapolated[width:]
+        else:
+            (base_price, base_momentum) = (price, first_momentum)
         tl.log_values(logging.DEBUG, [("price", price),
                                       ("sold", supply.sold()),
                                       ("bought", supply.bought()),
                                       ("fm*1000", first_momentum*1000)
                                     ])
     return price
+
+def make_markets(participants : Iterable[Participant], prices : Prices,
+                 configs : Sequence[EvaConfiguration],
+                 run : Optional[SolverRun] = None) -> list[Result]:
+    """
+    Runs eva on a batch of independent markets in lockstep. Row k of prices
+    is the initial price of market k, which is solved with configs[k]. All
+    markets are evaluated with one call to the participants, so they have to
+    accept a (markets x global width) batch of prices. Markets are retired
+    from the batch as soon as they converge or time out. All the markets
+    share one run.
+    """
+    if run is None:
+        run = SolverRun()
+    participants = list(participants)
+    num_markets = prices.shape[0]
+    assert len(configs) == num_markets
+    # the markets of a batch all take plain eva steps
+    if any(c.anderson_window > 0 for c in configs):
+        raise ValueError("make_markets does not support Anderson acceleration, "
+                         "use make_market for configurations with an anderson_window")
+    logging.info(f"starting eva on {num_markets} markets")
+
+    def column(values) -> np.ndarray:
+        return np.array(values, dtype=float)[:, np.newaxis]
+    rate = column([c.rate for c in configs])
+    mixin = column([c.first_momentum_mixin for c in configs])
+    initial_backoff = column([c.initial_backoff for c in configs])
+    epsilon = np.array([c.epsilon for c in configs])
+    max_iterations = np.array([np.inf if c.max_iterations is None
+                               else c.max_iterations for c in configs])
+
+    results : list[Optional[Result]] = [None] * num_markets
+    histories = [make_history(prices.shape[-1], c.keep_history, c.history,
+                              c.max_iterations) for c in configs]
+    # indices of the markets that are still running
+    active = np.arange(num_markets)
+    iterations = 1
+    price = np.array(prices, dtype=float)
+    supply = one_iteration(participants, price, run=run)
+    first_momentum = initial_backoff * supply.update_term()
+    while True:
+        badness = absolute_badness(supply)
+        for (row, market) in enumerate(active):
+            histories[market].record(iterations, price[row], supply[row],
+                                     badness[row], first_momentum[row])
+        converged = badness < epsilon[active]
+        timeout = iterations >= max_iterations[active]
+        for row in np.flatnonzero(converged | timeout):
+            market = active[row]
+            results[market] = Result(price=price[row],
+                                     supply=supply[row],
+                                     timeout=not converged[row],
+                                     iterations=iterations,
+                                     history=histories[market],
+                                     run=run)
+        running = ~(converged | timeout)
+        if not running.any():
+            return results
+        active = active[running]
+        price = price[running]
+        first_momentum = first_momentum[running]
+        logging.info(f"next iteration with {active.size} running markets")
+
+        price = price * (1 - rate[active] * first_momentum)
+        price = np.maximum(price, MIN_PRICE)
+        run.step += 1
+        supply = one_iteration(participants, price, run=run)
+        first_momentum = mixing(first_momentum, supply.update_term(),
+                                mixin[active])
+        iterations += 1
@@ -0,0 +1,212 @@
+from dataclasses import dataclass
+import math
+import os
+import shutil
+import tempfile
+import weakref
+from typing import Iterator, Optional
+
+import numpy as np
+
+from core.bundle import Bundle, VolumeBundle
+from core.participant import Prices
+
+@dataclass(frozen=True)
+class Iteration:
+    price: Prices
+    supply: Bundle
+    badness: float
+    momentum: np.ndarray
+
+@dataclass(frozen=True)
+class HistoryConfiguration:
+    # only every stride-th iteration of a market is recorded
+    stride: int = 1
+    # if set, only the last capacity recorded iterations are kept
+    capacity: int | None = None
+    # if set, the columns are memory mapped .npy files in a new directory
+    # inside of spill_directory instead of arrays in memory
+    spill_directory: str | None = None
+
+class History:
+    """
+    Records the iterations of a market in (iterations x listings) arrays,
+    one per field. The columns are views of these arrays,
+    so they can be sliced without copying. Indexing the history returns the
+    recorded iterations as Iteration objects for code that works on single
+    iterations.
+
+    A history that spills to files removes its directory when it is closed,
+    for example at the end of a with block, or else when it is garbage
+    collected.
+
+    With a capacity the history is a ring buffer. Every row is written twice,
+    capacity rows apart, so that the last capacity rows are always
+    contiguous and the columns stay views.
+    """
+
+    FIELDS = ("price", "error", "double_volume", "momentum")
+    INITIAL_ROWS = 64
+
+    def __init__(self, width: int, config: HistoryConfiguration = HistoryConfiguration(),
+                 max_iterations: Optional[int] = None):
+        assert config.stride >= 1
+        self._config = config
+        self._width = width
+        self._calls = 0
+        self._recorded = 0
+        if config.capacity is not None:
+            rows = 2 * config.capacity
+        elif config.spill_directory is not None and max_iterations is not None:
+            # files are made large enough for all iterations up front
+            rows = math.ceil(max_iterations / config.stride) + 1
+        else:
+            # arrays and files grow by doubling when they are full
+            rows = self.INITIAL_ROWS
+        self.directory = None
+        if config.spill_directory is not None:
+            os.makedirs(config.spill_directory, exist_ok=True)
+            self.directory = tempfile.mkdtemp(prefix="history-",
+                                              dir=config.spill_directory)
+            self._remove = weakref.finalize(self, shutil.rmtree, self.directory,
+                                            ignore_errors=True)
+        self._columns = {name: self._allocate(name, (rows, width), float)
+                         for name in self.FIELDS}
+        self._badness = self._allocate("badness", (rows,), float)
+        self._iterations = self._allocate("iterations", (rows,), int)
+
+    def _allocate(self, name: str, shape: tuple[int, ...], dtype,
+                  ending: str = ".npy") -> np.ndarray:
+        if self.directory is None:
+            return np.zeros(shape, dtype=dtype)
+        return np.lib.format.open_memmap(os.path.join(self.directory, name + ending),
+                                         mode='w+', dtype=dtype, shape=shape)
+
+    def _grow(self) -> None:
+        def grown(name: str, array: np.ndarray) -> np.ndarray:
+            # a spilled column is copied into a new file, which then replaces
+            # the old one, so views of the old file stay valid
+            result = self._allocate(name, (2 * array.shape[0],) + array.shape[1:],
+                                    array.dtype, ".grown.npy")
+            result[:array.shape[0]] = array
+            if self.directory is not None:
+                os.replace(os.path.join(self.directory, name + ".grown.npy"),
+                           os.path.join(self.directory, name + ".npy"))
+            return result
+        self._columns = {name: grown(name, array)
+                         for (name, array) in self._columns.items()}
+        self._badness = grown("badness", self._badness)
+        self._iterations = grown("iterations", self._iterations)
+
+    def record(self, iteration: int, price: Prices, supply: VolumeBundle,
+               badness: float, momentum: np.ndarray) -> None:
+        """
+        Records the state of the market after the given number of
+        iterations, if it is the turn of this call according to the stride.
+        """
+        self._calls += 1
+        if (self._calls - 1) % self._config.stride != 0:
+            return
+        capacity = self._config.capacity
+        if capacity is None:
+            if self._recorded == self._iterations.shape[0]:
+                self._grow()
+            rows = [self._recorded]
+        else:
+            slot = self._recorded % capacity
+            rows = [slot, slot + capacity]
+        values = zip(self.FIELDS, [price, supply.error, supply.double_volume,
+                                   momentum])
+        for (name, value) in values:
+            self._columns[name][rows] = value
+        self._badness[rows] = badness
+        self._iterations[rows] = iteration
+        self._recorded += 1
+
+    def _window(self) -> slice:
+        # the rows of the recorded iterations that are kept, in order
+        capacity = self._config.capacity
+        if capacity is None or self._recorded <= capacity:
+            return slice(0, self._recorded)
+        start = self._recorded % capacity
+        return slice(start, start + capacity)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns a (kept iterations x listings) view of one of the FIELDS.
+        """
+        return self._columns[name][self._window()]
+
+    def badness(self) -> np.ndarray:
+        return self._badness[self._window()]
+
+    def iterations(self) -> np.ndarray:
+        """The iteration numbers of the kept rows."""
+        return self._iterations[self._window()]
+
+    def flush(self) -> None:
+        if self.directory is not None:
+            for array in [*self._columns.values(), self._badness, self._iterations]:
+                array.flush()
+
+    def close(self) -> None:
+        """
+        Removes the files of a spilled history, which can not be used
+        afterwards.
+        """
+        if self.directory is not None:
+            self._columns = {}
+            self._remove()
+            self.directory = None
+
+    def __enter__(self) -> "History":
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        window = self._window()
+        return window.stop - window.start
+
+    def __getitem__(self, index: int) -> Iteration:
+        if not -len(self) <= index < len(self):
+            raise IndexError("history index out of range")
+        row = self._window().start + index % len(self)
+        supply = VolumeBundle(self._columns["error"][row],
+                              self._columns["double_volume"][row])
+        return Iteration(price=self._columns["price"][row],
+                         supply=supply,
+                         badness=float(self._badness[row]),
+                         momentum=self._columns["momentum"][row])
+
+    def __iter__(self) -> Iterator[Iteration]:
+        return (self[i] for i in range(len(self)))
+
+class NoHistory(History):
+    """Used when no history is kept, it records nothing."""
+
+    def __init__(self):
+        self.directory = None
+        self._config = HistoryConfiguration()
+        self._recorded = 0
+        self._columns = {name: np.zeros((0, 0)) for name in self.FIELDS}
+        self._badness = np.zeros(0)
+        self._iterations = np.zeros(0, dtype=int)
+
+    def record(self, iteration: int, price: Prices, supply: VolumeBundle,
+               badness: float, momentum: np.ndarray) -> None:
+        pass
+
+def make_history(width: int, keep_history: bool,
+                 config: Optional[HistoryConfiguration],
+                 max_iterations: Optional[int]) -> History:
+    """
+    Returns the history a market records into. A history configuration
+    implies keep_history.
+    """
+    if config is None and not keep_history:
+        return NoHistory()
+    if config is None:
+        config = HistoryConfiguration()
+    return History(width, config, max_iterations)
@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+
+from typing import Optional, Protocol
+
+from market.base import *
+import market.eva as eva
+from market.history import HistoryConfiguration, make_history
+import pretty_table as tl
+
+@dataclass(frozen=True)
+class LineSearchConfiguration:
+    epsilon: float = 0.1
+    # length of the first step along the eva direction
+    initial_backoff: float = 0.05
+    # factor by which a step is shortened if it is not good enough
+    backoff_decay: float = 0.5
+    # factor by which the step grows after it was accepted
+    step_growth: float = 1.2
+    max_step: float = 0.1
+    # a trial is accepted if its badness times necessary_improvement is at
+    # most the current badness. Every rejected trial relaxes the requirement
+    # by necessary_improvement_decay.
+    necessary_improvement: float = 1
+    necessary_improvement_decay: float = 0.95
+    first_momentum_mixin: float = 0.09
+    max_backtracks: int = 20
+    price_scaling: Optional[ScalingConfiguration] = None
+    max_iterations: int | None = 10000
+    keep_history: bool = False
+    history: Optional[HistoryConfiguration] = None
+
+@dataclass(frozen=True)
+class Trial:
+    price: Prices
+    supply: VolumeBundle
+    badness: float
+
+class BacktrackingConfiguration(Protocol):
+    backoff_decay: float
+    necessary_improvement: float
+    necessary_improvement_decay: float
+    max_backtracks: int
+
+def backtrack(participants : Iterable[Participant], price : Prices,
+              badness : float, step : float, direction : np.ndarray,
+              config : BacktrackingConfiguration,
+              run : Optional[SolverRun] = None) -> tuple[Trial, float, int]:
+    """
+    Searches for an acceptable step from price along the relative direction.
+    Returns the accepted trial, the length of its step and the number of
+    evaluations used. If no step is good enough then the shortest one that
+    was tried is returned.
+    """
+    necessary_improvement = config.necessary_improvement
+    evaluations = 0
+    for backtracks in range(config.max_backtracks):
+        if backtracks > 0:
+            step *= config.backoff_decay
+            necessary_improvement *= config.necessary_improvement_decay
+        trial_price = np.maximum(price * (1 - step * direction), MIN_PRICE)
+        trial_supply = one_iteration(participants, trial_price, run=run)
+        trial_badness = absolute_badness(trial_supply)
+        evaluations += 1
+        if necessary_improvement * trial_badness <= badness:
+            break
+        logging.info(f"backing off from step {step} with badness {trial_badness}")
+    return (Trial(trial_price, trial_supply, trial_badness), step, evaluations)
+
+def make_market(participants : Iterable[Participant], price : Prices,
+                config : LineSearchConfiguration = LineSearchConfiguration(),
+                run : Optional[SolverRun] = None) -> eva.Result:
+    """
+    Moves the prices along the momentum of the relative errors, like eva,
+    but chooses the length of every step, which plays the role of the rate of
+    eva, with a backtracking line search on the absolute badness. Steps grow
+    while they are accepted, so the market does not depend on a well chosen
+    rate. Like in eva, iterations counts the evaluations of the participants.
+    """
+    logging.info(f"starting line search")
+    participants = list(participants)
+    iterations = 1
+    history = make_history(price.shape[0], config.keep_history, config.history,
+                           config.max_iterations)
+    if run is None:
+        run = SolverRun()
+    run.history = history
+    supply = one_iteration(participants, price, run=run)
+    badness = absolute_badness(supply)
+    step = config.initial_backoff
+    # like eva we start with a damped momentum
+    direction = 0.1 * supply.update_term()
+    while True:
+        history.record(iterations, price, supply, badness, step * direction)
+        if badness < config.epsilon:
+            return eva.Result(price=price,
+                              supply=supply,
+                              timeout=False,
+                              iterations=iterations,
+                              history=history,
+                              run=run)
+        if config.max_iterations is not None and iterations >= config.max_iterations:
+            return eva.Result(price=price,
+                              supply=supply,
+                              timeout=True,
+                              iterations=iterations,
+                              history=history,
+                              run=run)
+        logging.info(f"\nnext iteration because of badness: {badness}")
+
+        (trial, step, evaluations) = backtrack(participants, price, badness,
+                                               step, direction, config, run)
+        iterations += evaluations
+        (price, supply, badness) = (trial.price, trial.supply, trial.badness)
+        run.step += 1
+        direction = mixing(direction, supply.update_term(),
+                           config.first_momentum_mixin)
+        if config.price_scaling is not None:
+            price = apply_price_scaling(price, config.price_scaling)
+        step = min(step * config.step_growth, config.max_step)
+        tl.log_values(logging.DEBUG, [("price", price),
+                                      ("sold", supply.sold()),
+                                      ("bought", supply.bought())
+                                    ])
@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+
+from typing import Optional
+
+from market.base import *
+import market.eva as eva
+from market.history import HistoryConfiguration, make_history
+import pretty_table as tl
+
+@dataclass(frozen=True)
+class NewtonConfiguration:
+    epsilon: float = 0.1
+    # largest change of a log price in one step
+    max_log_step: float = 1.0
+    # factor by which a step is shortened if it does not improve the badness
+    backoff: float = 0.5
+    # fraction of the badness that a full step needs to remove to be accepted
+    necessary_improvement: float = 0.0001
+    max_backtracks: int = 20
+    max_iterations: int | None = 1000
+    # every step solves a dense (width x width) least squares problem, which
+    # takes O(width**3) time and O(width**2) memory, so larger markets are
+    # refused
+    max_width: int = 2000
+    keep_history: bool = False
+    history: Optional[HistoryConfiguration] = None
+
+def total_jacobian(participants : Iterable[DifferentiableParticipant],
+                   prices : Prices) -> np.ndarray:
+    width = prices.shape[0]
+    jacobian = np.zeros((width, width))
+    for p in participants:
+        assert isinstance(p, DifferentiableParticipant)
+        jacobian += p.jacobian(prices)
+    return jacobian
+
+def newton_step(participants : Iterable[DifferentiableParticipant],
+                price : Prices, supply : VolumeBundle) -> np.ndarray:
+    """
+    Computes the Newton step for the excess supply in log-price space. The
+    errors are homogeneous of degree 0 in the prices, so the jacobian is
+    singular and we take the least squares solution with minimal norm. The
+    rows are scaled by the volume to make them comparable.
+    """
+    log_jacobian = total_jacobian(participants, price) * price[np.newaxis, :]
+    row_scaling = 1 / (supply.double_volume + 0.001)
+    (step, _, _, _) = np.linalg.lstsq(row_scaling[:, np.newaxis] * log_jacobian,
+                                      -row_scaling * supply.error, rcond=None)
+    return step
+
+def make_market(participants : Iterable[DifferentiableParticipant],
+                price : Prices,
+                config : NewtonConfiguration = NewtonConfiguration(),
+                run : Optional[SolverRun] = None) -> eva.Result:
+    """
+    Damped Newton method in log-price space. The step along the Newton
+    direction is shortened until it reduces the absolute badness. Like in eva,
+    iterations counts the evaluations of the participants.
+    """
+    logging.info(f"starting newton")
+    if price.shape[0] > config.max_width:
+        raise ValueError(f"newton solves markets of at most {config.max_width} "
+                         f"listings densely, this one has {price.shape[0]}")
+    participants = list(participants)
+    iterations = 1
+    history = make_history(price.shape[0], config.keep_history, config.history,
+                           config.max_iterations)
+    if run is None:
+        run = SolverRun()
+    run.history = history
+    supply = one_iteration(participants, price, run=run)
+    badness = absolute_badness(supply)
+    step = np.zeros(price.shape)
+    while True:
+        history.record(iterations, price, supply, badness, step)
+        if badness < config.epsilon:
+            return eva.Result(price=price,
+                              supply=supply,
+                              timeout=False,
+                              iterations=iterations,
+                              history=history,
+                              run=run)
+        if config.max_iterations is not None and iterations >= config.max_iterations:
+            return eva.Result(price=price,
+                              supply=supply,
+                              timeout=True,
+                              iterations=iterations,
+                              history=history,
+                              run=run)
+        logging.info(f"\nnext iteration because of badness: {badness}")
+
+        step = newton_step(participants, price, supply)
+        largest = np.max(np.abs(step))
+        if largest > config.max_log_step:
+            step *= config.max_log_step / largest
+        length = 1.0
+        for backtracks in range(config.max_backtracks):
+            if backtracks > 0:
+                length *= config.backoff
+            trial_price = np.maximum(price * np.exp(length * step), MIN_PRICE)
+            trial_supply = one_iteration(participants, trial_price, run=run)
+            trial_badness = absolute_badness(trial_supply)
+            iterations += 1
+            necessary = (1 - config.necessary_improvement * length) * badness
+            if trial_badness <= necessary:
+                break
+            if config.max_iterations is not None and iterations >= config.max_iterations:
+                break
+        # if no step was good enough we take the shortest one we tried
+        step = length * step
+        (price, supply, badness) = (trial_price, trial_supply, trial_badness)
+        run.step += 1
+        tl.log_values(logging.DEBUG, [("price", price),
+                                      ("sold", supply.sold()),
+                                      ("bought", supply.bought()),
+                                      ("step*1000", step*1000)
+                                    ])
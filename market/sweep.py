@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from typing import Iterator, Sequence
+
+from market.base import *
+import market.eva as eva
+
+# Every worker process loads the participants once in initialize_worker and
+# keeps them here for all the cells it solves.
+worker_participants : list[Participant] = []
+worker_best = None
+
+# larger than any iteration count
+UNBOUNDED = 2**31 - 1
+
+def initialize_worker(load_participants : Callable[[], Iterable[Participant]],
+                      best) -> None:
+    global worker_participants, worker_best
+    worker_participants = list(load_participants())
+    worker_best = best
+
+def solve_cell(index : int, price : Prices,
+               config : eva.EvaConfiguration, cancel_slower : bool
+              ) -> tuple[int, eva.Result]:
+    run = SolverRun()
+    if cancel_slower:
+        run.cancel = lambda: run.iteration > worker_best.value
+    result = eva.make_market(worker_participants, price, config, run)
+    # the cancel function can not be sent back to the main process
+    run.cancel = None
+    if not result.timeout:
+        with worker_best.get_lock():
+            worker_best.value = min(worker_best.value, result.iterations)
+    return (index, result)
+
+def sweep(load_participants : Callable[[], Iterable[Participant]],
+          price : Prices, configs : Sequence[eva.EvaConfiguration],
+          max_workers : Optional[int] = None,
+          cancel_slower : bool = True) -> Iterator[tuple[int, eva.Result]]:
+    """
+    Solves the market for every configuration in a pool of processes and
+    yields (index of the configuration, result) as soon as a cell is done.
+    The participants are not sent with every cell. Instead every worker calls
+    load_participants once, which has to be picklable, for example a module
+    level function like world_cache.cached_participants together with its
+    arguments in a functools.partial. Then the workers share the memory
+    mapped arrays of the economy.
+
+    With cancel_slower, a cell is stopped as soon as it needs more iterations
+    than the best cell that converged so far. Its result is a timeout with
+    run.cancelled set.
+    """
+    best = multiprocessing.Value('i', UNBOUNDED)
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=initialize_worker,
+                             initargs=(load_participants, best)) as pool:
+        futures = [pool.submit(solve_cell, index, price, config, cancel_slower)
+                   for (index, config) in enumerate(configs)]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,60 @@
+from dataclasses import dataclass, replace
+import math
+from typing import Sequence
+
+from market.base import *
+import market.eva as eva
+
+@dataclass(frozen=True)
+class TuningConfiguration:
+    epsilon: float = 0.1
+    rates: Sequence[float] = (0.01, 0.02, 0.04, 0.06, 0.08, 0.1, 0.15, 0.2)
+    first_momentum_mixins: Sequence[float] = (0.03, 0.06, 0.09, 0.12, 0.15)
+    # iterations of the candidates in the first round
+    initial_budget: int = 50
+    # every round keeps 1/reduction of the candidates and multiplies the
+    # budget by reduction
+    reduction: int = 3
+    max_iterations: int = 5000
+
+def score(result: eva.Result) -> tuple[float, float]:
+    # converged candidates are better than all others and the faster the
+    # better, the others are compared by how close they got
+    if not result.timeout:
+        return (result.iterations, 0)
+    badness = absolute_badness(result.supply)
+    # diverged candidates end with nan prices
+    return (math.inf, badness if np.isfinite(badness) else math.inf)
+
+def tune(participants : Iterable[Participant], price : Prices,
+         config : TuningConfiguration = TuningConfiguration()
+        ) -> eva.EvaConfiguration:
+    """
+    Searches the rate and first momentum mixin of eva by successive halving.
+    All candidates of the grid are solved with a small budget of iterations,
+    the best part of them with a larger budget and so on, until one is left
+    or the budget reaches max_iterations. The candidates of a round are solved
+    as one batch with eva.make_markets, so the participants have to accept
+    batches of prices like the ones of the fast labor economy.
+    """
+    participants = list(participants)
+    candidates = [eva.EvaConfiguration(epsilon=config.epsilon,
+                                       rate=rate,
+                                       first_momentum_mixin=mixin)
+                  for rate in config.rates
+                  for mixin in config.first_momentum_mixins]
+    budget = config.initial_budget
+    while True:
+        budget = min(budget, config.max_iterations)
+        truncated = [replace(c, max_iterations=budget) for c in candidates]
+        prices = np.tile(price, (len(candidates), 1))
+        with np.errstate(all='ignore'):
+            results = eva.make_markets(participants, prices, truncated)
+        ranking = sorted(range(len(candidates)), key=lambda i: score(results[i]))
+        logging.info(f"tuning with budget {budget}: best "
+                     f"{candidates[ranking[0]]} with {score(results[ranking[0]])}")
+        keep = max(1, len(candidates) // config.reduction)
+        candidates = [candidates[i] for i in ranking[:keep]]
+        if len(candidates) == 1 or budget == config.max_iterations:
+            return candidates[0]
+        budget *= config.reduction
@@ -1,5 +1,4 @@
 from functools import partial
-from itertools import chain
 import numpy as np
 from typing import Any, Callable, Iterable
 
@@ -32,8 +31,8 @@ def read_world(json_world: Any) -> economy.EconomyConfig:
             return province_schema.province_of_name(name)
         local_id = get_province_id(json_province['name'])
         other_ids = map(get_province_id, json_province['trade_partners'])
-        merchants = list(set_up_trade(local_schema.trade_goods(),
-                                      trade_factors, local_id, other_ids))
+        merchants = set_up_trade(local_schema.trade_goods(),
+                                 trade_factors, local_id, other_ids)
 
         config = economy.ProvinceConfig(population, utilities,
                                         factories, merchants)
@@ -49,17 +48,23 @@ def read_factory(local_schema: economy.TradeGoodsSchema,
     production_coefficients = local_schema.dict_to_vector(json_factory)
     return economy.FactoryConfig(production_coefficients)
 
-def concat_map(func: Callable[[Any], Iterable[Any]], it: Any) -> Iterable[Any]:
-    return chain.from_iterable(map(func, it))
-
 def set_up_trade(trade_goods: Iterable[GoodId], trade_factors: np.ndarray,
                  home: ProvinceId, trade_partners: Iterable[ProvinceId]
-                ) -> Iterable[economy.TradeConfig]:
-    def set_up_merchants(foreign: ProvinceId) -> Iterable[economy.TradeConfig]:
-        def for_good(good: GoodId) -> Iterable[economy.TradeConfig]:
-            factor = trade_factors[good]
-            return [economy.TradeConfig(good, home, foreign, factor),
-                    economy.TradeConfig(good, foreign, home, factor)]
-        return concat_map(for_good, trade_goods)
-    return concat_map(set_up_merchants, trade_partners)
-
+                ) -> economy.TradeRoutes:
+    """
+    For every partner and trade good there is one merchant that exports the
+    good to the partner and one that imports it from the partner.
+    """
+    goods = np.fromiter(trade_goods, int)
+    partners = np.fromiter(trade_partners, int)
+    # the routes are ordered by partner, then good and then direction
+    shape = (partners.size, goods.size, 2)
+    homes = np.full(shape[:2], home)
+    foreigns = np.broadcast_to(partners[:, np.newaxis], shape[:2])
+    from_provinces = np.stack([homes, foreigns], axis=-1)
+    to_provinces = np.stack([foreigns, homes], axis=-1)
+    route_goods = np.broadcast_to(goods[np.newaxis, :, np.newaxis], shape)
+    return economy.TradeRoutes(route_goods.ravel(),
+                               from_provinces.ravel(),
+                               to_provinces.ravel(),
+                               trade_factors[route_goods].ravel())
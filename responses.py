@@ -1,3 +1,4 @@
+import dataclasses
 import json
 import logging
 import numpy as np
@@ -8,8 +9,10 @@ from typing import Iterable
 import fast_labor_economy.labor_economy as ne
 import market.base as mb
 import market.eva as eva
+import market.tuning as tuning
 import pretty_table as pt
-from read_world import read_world
+from equilibrium_store import EquilibriumStore
+from world_cache import cached_economy, cached_tuning
 
 
 #np.set_printoptions(precision=3,suppress=True,threshold=12)
@@ -25,11 +28,7 @@ def responses() -> any:
     else:
         filename = "world.json"
 
-    with open(filename, "r", encoding='utf8') as input_stream:
-        parsed_json = json.load(input_stream)
-
-    economy_config = read_world(parsed_json)
-    economy = ne.LaborEconomy.from_config(economy_config)
+    economy = cached_economy(filename)
 
     schema = economy.market_schema()
     pt.set_global_table_logging_from_schema(schema)
@@ -50,35 +49,36 @@ def responses() -> any:
              keep_history = True,
              max_iterations = 10000
     )
-    config = eva.EvaConfiguration(
-             epsilon=epsilon,
-             rate = 0.08,
-             first_momentum_mixin = 0.09,
+    tuned = cached_tuning(filename, participants, p0,
+                          tuning.TuningConfiguration(epsilon=epsilon))
+    config = dataclasses.replace(tuned,
              keep_history = True,
              max_iterations = 1000
     )
     #config = duo_config
+    # the history shows the whole convergence from p0, so this run does not
+    # start from a stored equilibrium, but it still stores its own
     r = eva.make_market(participants, p0, config)
+    if not r.timeout:
+        EquilibriumStore().save(economy, r.price)
 
-    def iter_for_iteration(iteration: eva.Iteration) -> Iterable[float]:
-        return itertools.chain(iter(iteration.price),
-                               iter(iteration.supply.error),
-                               iter(iteration.supply.double_volume),
-                               map(lambda m: 1000 * 1000 * m, iter(iteration.momentum)))
-    nested_iterator = map(iter_for_iteration, r.history)
-    history_iter = itertools.chain.from_iterable(nested_iterator)
-    raw_data = list(history_iter)
+    # the columns of the history are views, only the json needs a copy
+    history = r.history
+    debug_data = np.stack([history.column("price"),
+                           history.column("error"),
+                           history.column("double_volume"),
+                           1000 * 1000 * history.column("momentum")], axis=1)
     debug_response = {
         "schema": [
            { "name": "iteration",
-             "indices": list(map(lambda i: i + 1, range(len(r.history)))) },
+             "indices": history.iterations().tolist() },
            { "name": "datatype",
              "indices": ["price", "error", "double_volume", "Mp"] },
            { "name": "province",
              "indices": schema.province_schema().list_of_names() },
            { "name": "good",
              "indices": schema.local_schema().list_of_names() } ],
-        "raw_data": raw_data
+        "raw_data": debug_data.ravel().tolist()
     }
 
     p = r.price
@@ -5,13 +5,22 @@ import numpy as np
 import core.economy as economy
 import wage_economy.wage_economy as we
 import labor_economy.labor_economy as le
+import fast_wage_economy.wage_economy as fwe
 import fast_labor_economy.labor_economy as ne
+from fast_labor_economy.compile import compile_participants
 from market.eva import *
+from market.history import HistoryConfiguration
 import market.base as mb
+import market.newton as newton
+import market.adam as adam
+import market.line_search as ls
+import market.elastic as el
 from core.schema import ProvinceSchema, TradeGoodsSchema
+from generate_world import WorldParameters, generate_world, generate_config
 from itertools import chain
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 @pytest.fixture
 def config():
@@ -76,8 +85,6 @@ def test_labor_against_wages(config):
     p0 = np.full(wschema.global_width(), 10)
     pw = make_market(wpart, p0).price
 
-    reset_iteration()
-
     p0 = np.full(lschema.global_width(), 10)
     pl = make_market(lpart, p0).price
 
@@ -124,3 +131,328 @@ def test_vectorized_labor(config):
     assert np.isclose(pl[lschema.production_slice_in_province(0)], pn[nschema.production_slice_in_province(0)]).all()
     assert np.isclose(pl[lschema.production_slice_in_province(1)], pn[nschema.production_slice_in_province(1)]).all()
 
+
+def test_batched_eva(config):
+    necon = ne.LaborEconomy.from_config(config)
+    npart = list(necon.participants())
+    nschema = necon.market_schema()
+
+    configs = [EvaConfiguration(rate=0.2, first_momentum_mixin=0.1),
+               EvaConfiguration(rate=0.1, first_momentum_mixin=0.2),
+               EvaConfiguration(rate=0.15, first_momentum_mixin=0.05,
+                                max_iterations=20)]
+    p0 = np.full(nschema.global_width(), 10.0)
+    results = make_markets(npart, np.tile(p0, (len(configs), 1)), configs)
+
+    for (c, r) in zip(configs, results):
+        expected = make_market(npart, p0, c)
+        assert r.iterations == expected.iterations
+        assert r.timeout == expected.timeout
+        assert np.isclose(r.price, expected.price).all()
+
+    with pytest.raises(ValueError):
+        make_markets(npart, p0[np.newaxis], [EvaConfiguration(anderson_window=3)])
+
+def test_newton_against_eva(config):
+    necon = ne.LaborEconomy.from_config(config)
+    npart = list(necon.participants())
+    nschema = necon.market_schema()
+
+    p0 = np.full(nschema.global_width(), 10.0)
+    pe = make_market(npart, p0).price
+    r = newton.make_market(npart, p0)
+
+    assert not r.timeout
+    assert r.iterations < 100
+
+    nscaling = mb.ScalingConfiguration(
+        set_to_price=10,
+        norm_listing=nschema.listing_of_good_in_province("food", "Italy"))
+
+    pe = mb.apply_price_scaling(pe, nscaling)
+    pn = mb.apply_price_scaling(r.price, nscaling)
+
+    assert np.isclose(pe, pn, rtol=1e-3).all()
+
+    # the backtracking also stops at max_iterations
+    for max_iterations in range(1, 6):
+        r = newton.make_market(npart, p0, newton.NewtonConfiguration(
+            epsilon=1e-12, max_iterations=max_iterations))
+        assert r.timeout
+        assert r.iterations == max_iterations
+    with pytest.raises(ValueError):
+        newton.make_market(npart, p0, newton.NewtonConfiguration(max_width=4))
+
+def test_anderson_against_eva(config):
+    necon = ne.LaborEconomy.from_config(config)
+    npart = list(necon.participants())
+    nschema = necon.market_schema()
+
+    p0 = np.full(nschema.global_width(), 10.0)
+    plain = make_market(npart, p0)
+    accelerated = make_market(npart, p0, EvaConfiguration(anderson_window=5))
+
+    assert not accelerated.timeout
+
+    nscaling = mb.ScalingConfiguration(
+        set_to_price=10,
+        norm_listing=nschema.listing_of_good_in_province("food", "Italy"))
+
+    pe = mb.apply_price_scaling(plain.price, nscaling)
+    pa = mb.apply_price_scaling(accelerated.price, nscaling)
+
+    assert np.isclose(pe, pa, rtol=1e-3).all()
+
+def test_adam_against_eva(config):
+    necon = ne.LaborEconomy.from_config(config)
+    npart = list(necon.participants())
+    nschema = necon.market_schema()
+
+    p0 = np.full(nschema.global_width(), 10.0)
+    pe = make_market(npart, p0).price
+    r = adam.make_market(npart, p0)
+
+    assert not r.timeout
+
+    nscaling = mb.ScalingConfiguration(
+        set_to_price=10,
+        norm_listing=nschema.listing_of_good_in_province("food", "Italy"))
+
+    pe = mb.apply_price_scaling(pe, nscaling)
+    pa = mb.apply_price_scaling(r.price, nscaling)
+
+    assert np.isclose(pe, pa, rtol=1e-3).all()
+
+def test_line_search_against_eva(config):
+    wecon = we.WageEconomy.from_config(config)
+    wpart = list(wecon.participants())
+    wschema = wecon.market_schema()
+
+    p0 = np.full(wschema.global_width(), 10.0)
+    pe = make_market(wpart, p0).price
+    r = ls.make_market(wpart, p0)
+
+    assert not r.timeout
+
+    wscaling = mb.ScalingConfiguration(
+        set_to_price=10,
+        norm_listing=wschema.listing_of_good_in_province("food", "Italy"))
+
+    pe = mb.apply_price_scaling(pe, wscaling)
+    pl = mb.apply_price_scaling(r.price, wscaling)
+
+    assert np.isclose(pe, pl, rtol=1e-3).all()
+
+def test_elastic_against_eva(config):
+    necon = ne.LaborEconomy.from_config(config)
+    npart = list(necon.participants())
+    nschema = necon.market_schema()
+
+    p0 = np.full(nschema.global_width(), 10.0)
+    pe = make_market(npart, p0).price
+    r = el.make_market(npart, p0)
+
+    assert not r.timeout
+
+    nscaling = mb.ScalingConfiguration(
+        set_to_price=10,
+        norm_listing=nschema.listing_of_good_in_province("food", "Italy"))
+
+    pe = mb.apply_price_scaling(pe, nscaling)
+    pl = mb.apply_price_scaling(r.price, nscaling)
+
+    assert np.isclose(pe, pl, rtol=1e-3).all()
+
+def test_participate_into(config):
+    lecon = le.LaborEconomy.from_config(config)
+    lpart = list(lecon.participants())
+    width = lecon.market_schema().global_width()
+    prices = np.random.default_rng(1).uniform(1, 20, width)
+
+    buffer = mb.VolumeBundle.zero(prices.shape)
+    buffer.error += 1
+    for p in lpart:
+        expected = p.participate(prices)
+        p.participate_into(prices, buffer)
+        buffer.error -= expected.error
+        buffer.double_volume -= expected.double_volume
+    assert np.allclose(buffer.error, 1)
+    assert np.allclose(buffer.double_volume, 0)
+
+    expected = mb.one_iteration(lpart, prices)
+    mb.one_iteration(lpart, prices, buffer)
+    assert np.allclose(buffer.error, expected.error)
+    assert np.allclose(buffer.double_volume, expected.double_volume)
+
+def test_fused_villages(config):
+    wecon = we.WageEconomy.from_config(config)
+    wpart = list(wecon.participants())
+    fecon = fwe.WageEconomy.from_config(config)
+    fpart = list(fecon.participants())
+    width = wecon.market_schema().global_width()
+    assert fecon.market_schema().global_width() == width
+
+    prices = np.random.default_rng(2).uniform(1, 20, (3, width))
+    for row in prices:
+        expected = mb.one_iteration(wpart, row)
+        fused = mb.one_iteration(fpart, row)
+        assert np.allclose(fused.error, expected.error)
+        assert np.allclose(fused.double_volume, expected.double_volume)
+    batched = mb.one_iteration(fpart, prices)
+    assert np.allclose(batched.error[1], mb.one_iteration(fpart, prices[1]).error)
+
+    p0 = np.full(width, 10)
+    pw = make_market(wpart, p0).price
+    pf = make_market(fpart, p0).price
+    assert np.allclose(pw, pf)
+
+def test_compile_participants(config):
+    lecon = le.LaborEconomy.from_config(config)
+    lpart = list(lecon.participants())
+    compiled = compile_participants(lpart)
+    assert len(compiled) == 3
+    width = lecon.market_schema().global_width()
+
+    prices = np.random.default_rng(3).uniform(1, 20, (3, width))
+    for row in prices:
+        expected = mb.one_iteration(lpart, row)
+        fused = mb.one_iteration(compiled, row)
+        assert np.allclose(fused.error, expected.error)
+        assert np.allclose(fused.double_volume, expected.double_volume)
+
+def test_generated_world():
+    parameters = WorldParameters(num_provinces=5, seed=7)
+    assert generate_world(parameters) == generate_world(parameters)
+    config = generate_config(parameters)
+    assert len(config.province_configs) == 5
+    with pytest.raises(ValueError):
+        generate_world(WorldParameters(num_tradable_goods=0))
+
+    lecon = le.LaborEconomy.from_config(config)
+    necon = ne.LaborEconomy.from_config(config)
+    width = lecon.market_schema().global_width()
+    prices = np.random.default_rng(4).uniform(1, 20, width)
+    expected = mb.one_iteration(list(lecon.participants()), prices)
+    fast = mb.one_iteration(list(necon.participants()), prices)
+    assert np.allclose(fast.error, expected.error)
+    assert np.allclose(fast.double_volume, expected.double_volume)
+
+def test_trade_routes(config):
+    merchants = config.province_configs[0].merchants
+    routes = economy.TradeRoutes.from_configs(merchants)
+    assert len(routes) == len(merchants)
+    assert list(routes) == merchants
+
+    columnar = economy.EconomyConfig(
+        config.goods_schema, config.province_schema,
+        [economy.ProvinceConfig(pc.population, pc.utilities, pc.factories,
+                                economy.TradeRoutes.from_configs(pc.merchants))
+         for pc in config.province_configs])
+    width = ne.LaborEconomy.from_config(config).market_schema().global_width()
+    prices = np.random.default_rng(6).uniform(1, 20, width)
+    for module in [le, ne]:
+        expected = mb.one_iteration(
+            list(module.LaborEconomy.from_config(config).participants()), prices)
+        result = mb.one_iteration(
+            list(module.LaborEconomy.from_config(columnar).participants()), prices)
+        assert np.allclose(result.error, expected.error)
+
+def test_eva_history(config):
+    necon = ne.LaborEconomy.from_config(config)
+    npart = list(necon.participants())
+    p0 = np.full(necon.market_schema().global_width(), 10.0)
+    history_config = HistoryConfiguration(stride=2, capacity=5)
+    r = make_market(npart, p0, EvaConfiguration(history=history_config))
+    assert len(r.history) == 5
+    assert r.history.iterations()[-1] >= r.iterations - 1
+    assert np.allclose(r.history[-1].price, r.history.column("price")[-1])
+
+    r = make_market(npart, p0, EvaConfiguration(keep_history=True))
+    assert len(r.history) == r.iterations
+    assert np.allclose(r.history[-1].price, r.price)
+    assert np.allclose(r.history[-1].supply.error, r.supply.error)
+
+def test_concurrent_runs(config):
+    necon = ne.LaborEconomy.from_config(config)
+    npart = list(necon.participants())
+    width = necon.market_schema().global_width()
+    configs = [EvaConfiguration(rate=rate) for rate in [0.05, 0.1, 0.15, 0.2]]
+    p0 = np.full(width, 10.0)
+    expected = [make_market(npart, p0, c) for c in configs]
+
+    iteration_before = mb.get_iteration()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        runs = [mb.SolverRun() for _ in configs]
+        futures = [pool.submit(make_market, npart, p0, c, run)
+                   for (c, run) in zip(configs, runs)]
+        results = [f.result() for f in futures]
+    assert mb.get_iteration() == iteration_before
+    for (e, r, run) in zip(expected, results, runs):
+        assert r.run is run
+        assert r.iterations == e.iterations == run.iteration
+        assert run.step == run.iteration - 1
+        assert np.allclose(r.price, e.price)
+
+def test_economy_mutations(config):
+    necon = ne.LaborEconomy.from_config(config)
+    width = necon.market_schema().global_width()
+    prices = np.random.default_rng(8).uniform(1, 20, (2, width))
+
+    def assert_same(edited: economy.EconomyConfig):
+        expected = mb.one_iteration(
+            list(ne.LaborEconomy.from_config(edited).participants()), prices)
+        result = mb.one_iteration(list(necon.participants()), prices)
+        assert np.allclose(result.error, expected.error)
+        assert np.allclose(result.double_volume, expected.double_volume)
+
+    (switzerland, italy) = config.province_configs
+    switzerland.population = 2000
+    necon.set_population(0, 2000)
+    assert_same(config)
+
+    for merchant in chain(switzerland.merchants, italy.merchants):
+        if merchant.good == 1:
+            merchant.trade_factor *= 0.5
+    necon.scale_trade_factor(1, 0.5)
+    assert_same(config)
+
+    # the new factory needs a new slot for every province
+    for _ in range(2):
+        farm = np.array([1.5, 0, 0.5, 0])
+        italy.factories.append(economy.FactoryConfig(farm))
+        slot = necon.add_factory(1, farm)
+    assert slot == 5
+    assert_same(config)
+    italy.factories.pop(1)
+    necon.remove_factory(1, 1)
+    assert_same(config)
+    with pytest.raises(AssertionError):
+        necon.remove_factory(1, 1)
+
+    merchant = economy.TradeConfig(3, 1, 0, 4.0)
+    switzerland.merchants.append(merchant)
+    route = necon.add_route(merchant, 0)
+    assert_same(config)
+    switzerland.merchants.remove(merchant)
+    necon.remove_route(route)
+    assert_same(config)
+    switzerland.merchants.pop(0)
+    necon.remove_route(0)
+    assert_same(config)
+    with pytest.raises(AssertionError):
+        necon.remove_route(0)
+    # a trade factor of 0 would leave routes that can not be removed
+    with pytest.raises(AssertionError):
+        necon.scale_trade_factor(0, 0.0)
+
+    # routes added after the first edits are found by later ones
+    merchant = economy.TradeConfig(1, 0, 1, 3.0)
+    switzerland.merchants.append(merchant)
+    necon.add_route(merchant, 0)
+    switzerland.population = 500
+    necon.set_population(0, 500)
+    for merchant in chain(switzerland.merchants, italy.merchants):
+        if merchant.good == 1:
+            merchant.trade_factor *= 2
+    necon.scale_trade_factor(1, 2)
+    assert_same(config)
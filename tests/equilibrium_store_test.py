@@ -0,0 +1,60 @@
+import copy
+import json
+
+import numpy as np
+
+import fast_labor_economy.labor_economy as ne
+import market.eva as eva
+import market.newton as newton
+from equilibrium_store import EquilibriumStore
+from read_world import read_world
+
+def economy_of(json_world):
+    return ne.LaborEconomy.from_config(read_world(json_world))
+
+def test_equilibrium_store(tmp_path, monkeypatch):
+    with open("world.json", "r", encoding='utf8') as input_stream:
+        world = json.load(input_stream)
+    economy = economy_of(world)
+    store = EquilibriumStore(str(tmp_path))
+    width = economy.market_schema().global_width()
+    assert (store.initial_price(economy) == 100).all()
+
+    config = eva.EvaConfiguration(epsilon=0.01, rate=0.1,
+                                  first_momentum_mixin=0.09)
+    r = eva.make_market(economy.participants(), np.full(width, 100.0), config)
+    store.save(economy, r.price)
+    assert np.allclose(store.initial_price(economy), r.price)
+
+    # a small edit gets the prices of the nearest stored economy
+    edited_world = copy.deepcopy(world)
+    edited_world["provinces"][0]["population"] += 20
+    edited = economy_of(edited_world)
+    far_world = copy.deepcopy(edited_world)
+    far_world["trade_factors"] = {good: 2 * factor for (good, factor)
+                                  in world["trade_factors"].items()}
+    store.save(economy_of(far_world), np.full(width, 1.0))
+    warm = store.initial_price(edited)
+    assert np.allclose(warm, r.price)
+    cold_newton = newton.make_market(edited.participants(), np.full(width, 100.0),
+                                     newton.NewtonConfiguration(epsilon=0.01))
+    warm_newton = newton.make_market(edited.participants(), warm,
+                                     newton.NewtonConfiguration(epsilon=0.01))
+    assert warm_newton.iterations < cold_newton.iterations
+
+    # a new province keeps the prices of the listings it shares
+    extended_world = copy.deepcopy(world)
+    extended_world["provinces"].append({
+        "name": "Poland", "population": 3000, "utilities": {"food": 2},
+        "producers": [{"food": 3}], "trade_partners": []})
+    extended = economy_of(extended_world)
+    # no entry has the schema of the extended economy, so only the prices of
+    # the chosen entry are loaded
+    loaded = []
+    load = np.load
+    monkeypatch.setattr(np, "load", lambda *args, **kwargs: loaded.append(args)
+                        or load(*args, **kwargs))
+    mapped = store.initial_price(extended)
+    assert len(loaded) == 1
+    assert np.allclose(mapped[:width], r.price)
+    assert (mapped[width:] == 100).all()
@@ -39,3 +39,118 @@ def test_fast_labor_consumers(consumers):
     assert np.isclose(vb.error, np.array([-400, -100, 150, -218.181818, -61.363636, 100])).all()
     assert np.isclose(vb.double_volume, np.array([400, 100, 150, 218.181818, 61.363636, 100])).all()
 
+
+@pytest.fixture
+def block_consumers():
+    populations = np.array([150, 100])
+    utilities = np.array([[1, 1],
+                          [2, 1]])
+    gi = np.array([[0, 1],
+                   [3, 4]])
+    li = np.array([2, 5])
+    consumers = c.BlockConsumers(populations, utilities, gi, li)
+    return consumers
+
+def test_block_consumers(block_consumers, consumers):
+    prices = np.array([10, 20, 40, 15, 20, 45])
+    vb = block_consumers.participate(prices)
+    expected = consumers.participate(prices)
+
+    assert np.isclose(vb.error, expected.error).all()
+    assert np.isclose(vb.double_volume, expected.double_volume).all()
+
+def test_traders_against_producers():
+    pm = np.array([[-2, 0, 2, 0, 0],
+                   [ 2, 0,-2, 0, 0],
+                   [ 0, 3, 0, 0,-3],
+                   [ 0,-1, 0, 0, 1]])
+    li = np.array([3, 3, 3, 1])
+    producers = p.Producers(pm, li)
+    traders = p.Traders(np.array([0, 2, 4, 1]), np.array([2, 0, 1, 4]),
+                        np.array([2.0, 2, 3, 1]), li)
+    prices = np.array([15, 10, 20, 10, 12])
+    vb = traders.participate(prices)
+    expected = producers.participate(prices)
+
+    assert np.isclose(vb.error, expected.error).all()
+    assert np.isclose(vb.double_volume, expected.double_volume).all()
+
+def test_factories_against_producers():
+    pm = np.array([[ 1, 2, 0, 0, 0, 0],
+                   [-1, 3, 0, 0, 0, 0],
+                   [ 0, 0, 0, 2,-1, 0],
+                   [ 0, 0, 0, 0, 0, 0]])
+    li = np.array([2, 2, 5, 5])
+    producers = p.Producers(pm, li)
+    coefficients = np.array([[[ 1, 2],
+                              [-1, 3]],
+                             [[ 2,-1],
+                              [ 0, 0]]])
+    factories = p.Factories(coefficients, np.array([[0, 1], [3, 4]]),
+                            np.array([2, 5]))
+    prices = np.array([10, 20, 40, 15, 20, 45])
+    vb = factories.participate(prices)
+    expected = producers.participate(prices)
+
+    assert np.isclose(vb.error, expected.error).all()
+    assert np.isclose(vb.double_volume, expected.double_volume).all()
+
+def test_batched_participate(producers, consumers, block_consumers):
+    traders = p.Traders(np.array([0, 3]), np.array([3, 0]),
+                        np.array([2.0, 1.5]), np.array([2, 5]))
+    factories = p.Factories(np.array([[[1, 2]], [[2, -1]]]),
+                            np.array([[0, 1], [3, 4]]), np.array([2, 5]))
+    prices = np.array([[10, 20, 40, 15, 20, 45],
+                       [12, 18, 30, 25, 20, 40],
+                       [30, 10, 20, 15, 10, 45]])
+    for participant in [consumers, block_consumers, traders, factories]:
+        vb = participant.participate(prices)
+        for (k, row) in enumerate(prices):
+            expected = participant.participate(row)
+            assert np.isclose(vb.error[k], expected.error).all()
+            assert np.isclose(vb.double_volume[k], expected.double_volume).all()
+
+    vb = producers.participate(prices[:, :4])
+    for (k, row) in enumerate(prices[:, :4]):
+        expected = producers.participate(row)
+        assert np.isclose(vb.error[k], expected.error).all()
+        assert np.isclose(vb.double_volume[k], expected.double_volume).all()
+
+def test_compacted_routes():
+    traders = p.Traders(np.array([0, 2, 4, 1]), np.array([2, 0, 1, 4]),
+                        np.array([2.0, 2, 3, 1]), np.array([3, 3, 3, 1]))
+    prices = np.array([[15, 10, 20, 10, 12],
+                       [25, 10, 20, 10, 12],
+                       [25, 10, 20, 10, 12]])
+    for (k, row) in enumerate(prices):
+        if k == 2:
+            # changing the routes drops the compacted ones
+            traders.remove_route(1)
+            traders.add_route(1, 4, 2.0, 1)
+        vb = traders.participate(row)
+        expected = traders.participate(row[np.newaxis])
+        assert np.isclose(vb.error, expected.error).all()
+        assert np.isclose(vb.double_volume, expected.double_volume).all()
+
+def numerical_jacobian(participant, prices, h=1e-6):
+    columns = []
+    for j in range(prices.shape[0]):
+        step = np.zeros(prices.shape[0])
+        step[j] = h * prices[j]
+        up = participant.participate(prices + step).error
+        down = participant.participate(prices - step).error
+        columns.append((up - down) / (2 * step[j]))
+    return np.stack(columns, axis=1)
+
+def test_jacobians(producers, consumers, block_consumers):
+    traders = p.Traders(np.array([0, 3]), np.array([3, 0]),
+                        np.array([2.0, 1.5]), np.array([2, 5]))
+    factories = p.Factories(np.array([[[1, 2], [-1, 0]], [[2, -1], [1, 1]]]),
+                            np.array([[0, 1], [3, 4]]), np.array([2, 5]))
+    prices = np.array([10.0, 20, 40, 15, 20, 45])
+    for participant in [consumers, block_consumers, traders, factories]:
+        expected = numerical_jacobian(participant, prices)
+        assert np.allclose(participant.jacobian(prices), expected, atol=1e-5)
+
+    expected = numerical_jacobian(producers, prices[:4])
+    assert np.allclose(producers.jacobian(prices[:4]), expected, atol=1e-5)
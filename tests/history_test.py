@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+
+from core.bundle import VolumeBundle
+from market.history import *
+
+def record(history, iterations):
+    for i in iterations:
+        values = np.full(3, float(i))
+        history.record(i, values, VolumeBundle(-values, 2 * values), i / 10,
+                       values / 100)
+
+def test_history_grows():
+    history = History(3)
+    record(history, range(1, 201))
+    assert len(history) == 200
+    assert (history.iterations() == np.arange(1, 201)).all()
+    assert (history.column("error")[:, 0] == -history.iterations()).all()
+    iteration = history[-1]
+    assert iteration.badness == 20.0
+    assert (iteration.supply.double_volume == 400).all()
+    assert [it.price[0] for it in history][:3] == [1, 2, 3]
+
+def test_history_stride_and_ring():
+    history = History(3, HistoryConfiguration(stride=3, capacity=4))
+    record(history, range(1, 21))
+    # iterations 1, 4, ..., 19 are recorded and the last 4 are kept
+    assert (history.iterations() == [10, 13, 16, 19]).all()
+    price = history.column("price")
+    assert price.base is not None
+    assert (price[:, 2] == [10, 13, 16, 19]).all()
+    assert history[0].badness == 1.0
+
+def test_history_spill(tmp_path):
+    config = HistoryConfiguration(spill_directory=str(tmp_path))
+    history = History(3, config, max_iterations=10)
+    record(history, range(1, 11))
+    history.flush()
+    stored = np.load(os.path.join(history.directory, "momentum.npy"),
+                     mmap_mode='r')
+    assert (stored[:10, 1] == np.arange(1, 11) / 100).all()
+    assert (history.column("momentum") == stored[:10]).all()
+
+def test_history_spill_unbounded(tmp_path):
+    # without max_iterations the files grow like the arrays in memory
+    config = HistoryConfiguration(spill_directory=str(tmp_path))
+    history = History(3, config)
+    record(history, range(1, 11))
+    first = history.column("momentum")
+    record(history, range(11, 201))
+    history.flush()
+    stored = np.load(os.path.join(history.directory, "momentum.npy"),
+                     mmap_mode='r')
+    assert (stored[:200, 1] == np.arange(1, 201) / 100).all()
+    assert (history.column("momentum") == stored[:200]).all()
+    # views taken before the files grew still read the old rows
+    assert (first[:, 1] == np.arange(1, 11) / 100).all()
+    assert sorted(os.listdir(history.directory)) == sorted(
+        name + ".npy" for name in History.FIELDS + ("badness", "iterations"))
+
+def test_history_spill_removed(tmp_path):
+    config = HistoryConfiguration(spill_directory=str(tmp_path))
+    with History(3, config, max_iterations=10) as history:
+        record(history, range(1, 4))
+        directory = history.directory
+        assert os.path.isdir(directory)
+    assert not os.path.exists(directory)
+
+    history = History(3, config, max_iterations=10)
+    directory = history.directory
+    del history
+    assert not os.path.exists(directory)
@@ -0,0 +1,45 @@
+import pytest
+
+import numpy as np
+
+from core.schema import *
+
+@pytest.fixture
+def schema():
+    local_schema = LaborTradeGoodsSchema.from_lists(["food", "wood", "ore"],
+                                                    ["services"])
+    province_schema = ProvinceSchema(["Switzerland", "Italy", "France"])
+    return LaborMarketPriceSchema(local_schema, province_schema)
+
+def test_name_lookup(schema):
+    local_schema = schema.local_schema()
+    assert local_schema.good_of_name("ore") == 2
+    assert local_schema.good_of_name("labor") == local_schema.labour()
+    assert schema.province_schema().province_of_name("France") == 2
+    assert (local_schema.goods_of_names(["services", "food"]) == [3, 0]).all()
+    assert (local_schema.dict_to_vector({"wood": 2, "services": 1})
+            == [0, 2, 0, 1]).all()
+    with pytest.raises(KeyError):
+        local_schema.good_of_name("gold")
+
+def test_listings_of(schema):
+    listings = schema.listings_of(["ore", "food"], ["Italy", "Switzerland"])
+    expected = [schema.listing_of_good_in_province(g, p)
+                for p in ["Italy", "Switzerland"] for g in ["ore", "food"]]
+    assert listings.tolist() == expected
+
+    listings = schema.listings_of(None, None, goods_major=True)
+    expected = [schema.good_in_province(g, p)
+                for g in range(schema.local_width())
+                for p in range(schema.province_schema().num_provinces())]
+    assert listings.tolist() == expected
+    assert schema.list_provinces_over_goods(None, None) == expected
+    assert (sorted(schema.list_goods_in_provinces(None, None))
+            == list(range(schema.global_width())))
+
+def test_decompose(schema):
+    listings = np.arange(schema.global_width())
+    (provinces, goods) = schema.decompose(listings)
+    for listing in listings:
+        assert schema.decompose(listing) == (provinces[listing], goods[listing])
+        assert schema.good_in_province(goods[listing], provinces[listing]) == listing
@@ -0,0 +1,32 @@
+import functools
+
+import numpy as np
+
+import market.eva as eva
+import market.sweep as sweep
+import world_cache as wc
+
+def test_sweep(tmp_path):
+    load = functools.partial(wc.cached_participants, "world.json", str(tmp_path))
+    participants = load()
+    economy = wc.cached_economy("world.json", str(tmp_path))
+    p0 = np.full(economy.market_schema().global_width(), 100.0)
+    configs = [eva.EvaConfiguration(epsilon=0.1, rate=rate,
+                                    first_momentum_mixin=0.09,
+                                    max_iterations=1000)
+               for rate in [0.06, 0.08, 0.1]]
+    expected = [eva.make_market(participants, p0, c) for c in configs]
+
+    results = dict(sweep.sweep(load, p0, configs, max_workers=2,
+                               cancel_slower=False))
+    assert sorted(results.keys()) == [0, 1, 2]
+    for (index, e) in enumerate(expected):
+        assert results[index].iterations == e.iterations
+        assert np.allclose(results[index].price, e.price)
+
+    best = min(e.iterations for e in expected)
+    for (index, r) in sweep.sweep(load, p0, configs, max_workers=2):
+        if r.run.cancelled:
+            assert r.timeout and r.iterations > best
+        else:
+            assert r.iterations == expected[index].iterations
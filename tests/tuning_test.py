@@ -0,0 +1,39 @@
+import numpy as np
+
+import market.eva as eva
+import market.tuning as mt
+import world_cache as wc
+
+def test_cached_tuning(tmp_path):
+    economy = wc.cached_economy("world.json", str(tmp_path))
+    participants = list(economy.participants())
+    p0 = np.full(economy.market_schema().global_width(), 100.0)
+    tuning = mt.TuningConfiguration(epsilon=0.1, rates=(0.01, 0.08, 0.5),
+                                    first_momentum_mixins=(0.09, 0.5))
+    tuned = wc.cached_tuning("world.json", participants, p0, tuning, str(tmp_path))
+    assert tuned.epsilon == 0.1
+    # the small rate is too slow and the large ones diverge
+    assert tuned.rate == 0.08
+
+    r = eva.make_market(participants, p0, tuned)
+    assert not r.timeout
+    cached = wc.cached_tuning("world.json", [], p0, tuning, str(tmp_path))
+    assert cached == tuned
+
+def test_tuning_before_economy(tmp_path):
+    economy = wc.cached_economy("world.json", str(tmp_path / "other"))
+    participants = list(economy.participants())
+    p0 = np.full(economy.market_schema().global_width(), 100.0)
+    tuning = mt.TuningConfiguration(epsilon=0.1, rates=(0.08,),
+                                    first_momentum_mixins=(0.09,))
+    tuned = wc.cached_tuning("world.json", participants, p0, tuning, str(tmp_path))
+    # the tuning does not leave an incomplete entry of the economy behind
+    loaded = wc.cached_economy("world.json", str(tmp_path))
+    assert loaded.market_schema().global_width() == p0.shape[0]
+
+    # another grid or initial price is tuned again
+    other = mt.TuningConfiguration(epsilon=0.1, rates=(0.06,),
+                                   first_momentum_mixins=(0.09,))
+    assert wc.cached_tuning("world.json", participants, p0, other,
+                            str(tmp_path)).rate == 0.06
+    assert wc.cached_tuning("world.json", [], p0, tuning, str(tmp_path)) == tuned
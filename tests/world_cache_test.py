@@ -0,0 +1,35 @@
+import json
+import os
+
+import numpy as np
+
+import fast_labor_economy.labor_economy as ne
+import market.base as mb
+import world_cache as wc
+from read_world import read_world
+
+def test_cached_economy(tmp_path):
+    with open("world.json", "r", encoding='utf8') as input_stream:
+        economy = ne.LaborEconomy.from_config(read_world(json.load(input_stream)))
+    compiled = wc.cached_economy("world.json", str(tmp_path))
+    directory = wc.entry_directory("world.json", str(tmp_path))
+    assert os.path.isfile(os.path.join(directory, "meta.json"))
+    loaded = wc.cached_economy("world.json", str(tmp_path))
+
+    schema = economy.market_schema()
+    loaded_schema = loaded.market_schema()
+    assert loaded_schema.global_width() == schema.global_width()
+    assert (loaded_schema.listing_of_good_in_province("food", "Italy")
+            == schema.listing_of_good_in_province("food", "Italy"))
+    assert loaded.population_in_province(1) == economy.population_in_province(1)
+
+    prices = np.random.default_rng(5).uniform(1, 20, schema.global_width())
+    expected = mb.one_iteration(list(economy.participants()), prices)
+    for e in [compiled, loaded]:
+        result = mb.one_iteration(list(e.participants()), prices)
+        assert np.allclose(result.error, expected.error)
+        assert np.allclose(result.double_volume, expected.double_volume)
+
+    # all the arrays of the loaded economy stay memory mapped
+    for array in loaded.to_arrays().values():
+        assert isinstance(array, np.memmap)
@@ -0,0 +1,143 @@
+"""
+Caches the fast labor economy of a world file on disk. The first run reads
+the json, builds the economy and stores its arrays. Later runs only memory
+map the arrays, so they start quickly and processes working on the same
+world share the pages.
+
+Every entry is a directory named after the hash of the world file and the
+version of the format. It holds the schemas in meta.json and one .npy file
+per array, since np.load can only memory map single .npy files and not the
+members of an .npz archive.
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Iterable
+
+import numpy as np
+
+import fast_labor_economy.labor_economy as ne
+from core.participant import Participant
+import market.eva as eva
+import market.tuning as mt
+from core.schema import (LaborMarketPriceSchema, LaborTradeGoodsSchema,
+                         ProvinceSchema, TradeGoodsSchema)
+from read_world import read_world
+
+# increase this whenever the stored arrays change, that is whenever the
+# arrays() of the participants of the fast labor economy change
+# 2: Factories also stores abs_coefficients
+CACHE_VERSION = 2
+CACHE_DIRECTORY = ".world_cache"
+
+def world_hash(filename: str) -> str:
+    with open(filename, "rb") as input_stream:
+        return hashlib.sha256(input_stream.read()).hexdigest()
+
+def entry_directory(filename: str, cache_directory: str) -> str:
+    return os.path.join(cache_directory,
+                        f"{world_hash(filename)}-v{CACHE_VERSION}")
+
+def schema_to_json(market_schema: LaborMarketPriceSchema) -> dict[str, Any]:
+    local_schema = market_schema.local_schema()
+    names = local_schema.list_of_names()
+    trade_slice = local_schema.trade_slice()
+    return {
+        "tradable_goods": names[trade_slice],
+        "fixed_goods": names[trade_slice.stop:local_schema.production_width()],
+        "provinces": market_schema.province_schema().list_of_names(),
+    }
+
+def schema_from_json(json_schema: dict[str, Any]) -> LaborMarketPriceSchema:
+    local_schema = TradeGoodsSchema.from_lists(json_schema["tradable_goods"],
+                                               json_schema["fixed_goods"])
+    return LaborMarketPriceSchema(LaborTradeGoodsSchema(local_schema),
+                                  ProvinceSchema(json_schema["provinces"]))
+
+def save_economy(economy: ne.LaborEconomy, directory: str) -> None:
+    """
+    Stores the economy in directory. The entry is written to a temporary
+    directory first and then renamed, so readers never see half an entry.
+    """
+    parent = os.path.dirname(directory) or "."
+    os.makedirs(parent, exist_ok=True)
+    temporary = tempfile.mkdtemp(dir=parent)
+    arrays = economy.to_arrays()
+    for (name, array) in arrays.items():
+        np.save(os.path.join(temporary, name + ".npy"), array)
+    meta = {"version": CACHE_VERSION,
+            "schema": schema_to_json(economy.market_schema()),
+            "arrays": list(arrays.keys())}
+    with open(os.path.join(temporary, "meta.json"), "w", encoding='utf8') as output_stream:
+        json.dump(meta, output_stream)
+    try:
+        os.rename(temporary, directory)
+    except OSError:
+        # another process stored the same entry in the meantime
+        shutil.rmtree(temporary)
+
+def load_economy(directory: str) -> ne.LaborEconomy:
+    with open(os.path.join(directory, "meta.json"), "r", encoding='utf8') as input_stream:
+        meta = json.load(input_stream)
+    assert meta["version"] == CACHE_VERSION
+    arrays = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode='r')
+              for name in meta["arrays"]}
+    return ne.LaborEconomy.from_arrays(schema_from_json(meta["schema"]), arrays)
+
+def cached_economy(filename: str,
+                   cache_directory: str = CACHE_DIRECTORY) -> ne.LaborEconomy:
+    """
+    Returns the fast labor economy of the world in filename, from the cache
+    if the file was compiled before.
+    """
+    directory = entry_directory(filename, cache_directory)
+    if os.path.isdir(directory):
+        return load_economy(directory)
+    with open(filename, "r", encoding='utf8') as input_stream:
+        economy_config = read_world(json.load(input_stream))
+    economy = ne.LaborEconomy.from_config(economy_config)
+    save_economy(economy, directory)
+    return economy
+
+def cached_participants(filename: str,
+                        cache_directory: str = CACHE_DIRECTORY) -> list[Participant]:
+    return list(cached_economy(filename, cache_directory).participants())
+
+def tuning_path(filename: str, price: np.ndarray, tuning: mt.TuningConfiguration,
+                cache_directory: str) -> str:
+    # tuning results do not belong to a compiled economy, so they live next
+    # to the entries, named after the world, the search grid and the price
+    # the search starts from
+    digest = hashlib.sha256()
+    digest.update(json.dumps(dataclasses.asdict(tuning)).encode())
+    digest.update(np.ascontiguousarray(price, dtype=float).tobytes())
+    return os.path.join(cache_directory, "tuning",
+                        f"{world_hash(filename)}-{digest.hexdigest()}.json")
+
+def cached_tuning(filename: str, participants: Iterable[Participant],
+                  price: np.ndarray,
+                  tuning: mt.TuningConfiguration = mt.TuningConfiguration(),
+                  cache_directory: str = CACHE_DIRECTORY) -> eva.EvaConfiguration:
+    """
+    Returns the eva configuration that market.tuning found for the world in
+    filename. The tuned rate and first momentum mixin are stored in the
+    cache, so the world is only tuned once for every tuning configuration
+    and initial price.
+    """
+    path = tuning_path(filename, price, tuning, cache_directory)
+    if os.path.isfile(path):
+        with open(path, "r", encoding='utf8') as input_stream:
+            tuned = json.load(input_stream)
+        return eva.EvaConfiguration(**tuned)
+    config = mt.tune(participants, price, tuning)
+    tuned = {"epsilon": config.epsilon,
+             "rate": config.rate,
+             "first_momentum_mixin": config.first_momentum_mixin}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding='utf8') as output_stream:
+        json.dump(tuned, output_stream)
+    return config